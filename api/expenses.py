@@ -2,45 +2,26 @@ from http.server import BaseHTTPRequestHandler
 import json
 from datetime import datetime
 import os
+import sys
 
-# Inline storage functions
-def load_expenses():
-    storage_file = '/tmp/expenses.json'
-    if os.path.exists(storage_file):
-        with open(storage_file, 'r') as f:
-            return json.load(f)
-    return []
-
-def save_expenses(expenses):
-    storage_file = '/tmp/expenses.json'
-    with open(storage_file, 'w') as f:
-        json.dump(expenses, f)
+# Shared storage lives next to the handlers. It is imported on first use, so a preflight
+# OPTIONS never loads it, and stays loaded with its warm cache across warm invocations.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 class handler(BaseHTTPRequestHandler):
     def do_POST(self):
+        import storage
+        
         content_length = int(self.headers['Content-Length'])
         post_data = self.rfile.read(content_length)
         data = json.loads(post_data.decode('utf-8'))
+        # The key is the record's identity in the log: retries, dedup and compaction all rely on it
+        if not isinstance(data.get('idempotency_key'), str) or not data['idempotency_key']:
+            self.send_error(400, 'idempotency_key is required')
+            return
         
-        expenses = load_expenses()
-        
-        # Check for existing expense with same idempotency key
-        existing = next((e for e in expenses if e.get('idempotency_key') == data.get('idempotency_key')), None)
-        if existing:
-            expense = existing
-        else:
-            # Create new expense
-            expense = {
-                'id': len(expenses) + 1,
-                'idempotency_key': data.get('idempotency_key'),
-                'amount_cents': int(data['amount'] * 100),
-                'category': data['category'],
-                'description': data['description'],
-                'date': data['date'],
-                'created_at': datetime.now().isoformat()
-            }
-            expenses.append(expense)
-            save_expenses(expenses)
+        # Appends to the shared log; returns the original expense for a repeated idempotency key
+        expense = storage.add_expense({**data, 'created_at': datetime.now().isoformat()})
         
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
@@ -1,46 +1,132 @@
 from http.server import BaseHTTPRequestHandler
+import base64
+import binascii
 import json
+import math
 import os
+import sys
+from datetime import date
 from urllib.parse import parse_qs, urlparse
 
-# Inline storage functions
-def load_expenses():
-    storage_file = '/tmp/expenses.json'
-    if os.path.exists(storage_file):
-        with open(storage_file, 'r') as f:
-            return json.load(f)
-    return []
+# Shared storage lives next to the handlers. It is imported on first use, so a preflight
+# OPTIONS never loads it, and stays loaded with its warm cache across warm invocations.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MAX_PAGE_SIZE = 500
+MAX_FILTER_AMOUNT = 10 ** 15  # same bound as the backend's min_amount/max_amount
+# Long-polls stay well inside the serverless function time limit
+MAX_CHANGES_WAIT = 8
+
+# Cursors share the backend format: base64 of [sort, sort value, id]
+def encode_cursor(sort, value, expense_id):
+    raw = json.dumps([sort, value, expense_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def amount_cents(amount):
+    """Parse an amount filter into cents, rejecting negative, non-finite or oversized values"""
+    amount = float(amount)
+    if not math.isfinite(amount) or not 0 <= amount <= MAX_FILTER_AMOUNT:
+        raise ValueError('amount out of range')
+    return round(amount * 100)
+
+def decode_cursor(cursor, sort):
+    cursor_sort, value, expense_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if cursor_sort != sort:
+        raise ValueError('cursor was issued for a different sort order')
+    # Sort values are ISO strings; anything else would fail later, comparing against the index
+    if not isinstance(value, str) or not isinstance(expense_id, int):
+        raise ValueError('malformed cursor')
+    return value, expense_id
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        import storage
+        
         # Parse query parameters
         parsed_url = urlparse(self.path)
+        # since, even when empty, switches to the change feed
+        changes_params = parse_qs(parsed_url.query, keep_blank_values=True)
+        if 'since' in changes_params:
+            self.send_changes(changes_params)
+            return
         params = parse_qs(parsed_url.query)
-        category = params.get('category', [None])[0]
+        categories = params.get('category', [])
         sort_param = params.get('sort', [None])[0]
+        limit = params.get('limit', [None])[0]
+        cursor = params.get('cursor', [None])[0]
+        date_from = params.get('date_from', [None])[0]
+        date_to = params.get('date_to', [None])[0]
+        min_amount = params.get('min_amount', [None])[0]
+        max_amount = params.get('max_amount', [None])[0]
+        description_prefix = params.get('description_prefix', [None])[0] or None
         
-        # Load expenses from shared storage
-        expenses = load_expenses()
+        sort = 'date_desc' if sort_param == 'date_desc' else 'created_desc'
         
-        # Filter by category
-        if category:
-            expenses = [e for e in expenses if e.get('category') == category]
+        try:
+            limit = int(limit) if limit is not None else None
+            if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+                raise ValueError('limit out of range')
+            after = decode_cursor(cursor, sort) if cursor else None
+            # Dates are compared as ISO strings, amounts in cents
+            date_from = date.fromisoformat(date_from).isoformat() if date_from else None
+            date_to = date.fromisoformat(date_to).isoformat() if date_to else None
+            min_cents = amount_cents(min_amount) if min_amount else None
+            max_cents = amount_cents(max_amount) if max_amount else None
+        except (ValueError, TypeError, binascii.Error):
+            self.send_error(400, 'Invalid query parameter')
+            return
         
-        # Sort expenses
-        if sort_param == 'date_desc':
-            expenses = sorted(expenses, key=lambda x: x.get('date', ''), reverse=True)
-        else:
-            expenses = sorted(expenses, key=lambda x: x.get('created_at', ''), reverse=True)
+        # Load the requested page from shared storage
+        expenses, last_key = storage.get_expenses(
+            categories, sort_param, limit, after,
+            date_from=date_from, date_to=date_to, min_cents=min_cents, max_cents=max_cents,
+            description_prefix=description_prefix,
+        )
+        next_cursor = encode_cursor(sort, *last_key) if last_key else None
         
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Expose-Headers', 'X-Next-Cursor')
+        if next_cursor:
+            self.send_header('X-Next-Cursor', next_cursor)
         self.end_headers()
         
         self.wfile.write(json.dumps(expenses).encode())
     
+    def send_changes(self, params):
+        """?since=<seq>: records appended after seq plus the new high-water mark; an empty since returns only the mark"""
+        import storage
+        
+        try:
+            since = params['since'][0]
+            since = int(since) if since else None
+            limit = int(params.get('limit', [MAX_PAGE_SIZE])[0] or MAX_PAGE_SIZE)
+            wait = float(params.get('wait', [0])[0] or 0)
+            if (since is not None and since < 0) or not 1 <= limit <= MAX_PAGE_SIZE or wait < 0:
+                raise ValueError('parameter out of range')
+        except ValueError:
+            self.send_error(400, 'Invalid query parameter')
+            return
+        
+        size = storage.log_size()
+        expenses, high_water, has_more = storage.get_changes(since, limit)
+        if since is not None and not expenses and wait:
+            # Nothing new yet: hold the request until the log grows, watching only its size
+            storage.wait_for_append(size, min(wait, MAX_CHANGES_WAIT))
+            expenses, high_water, has_more = storage.get_changes(since, limit)
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+        
+        self.wfile.write(json.dumps({'expenses': expenses, 'since': high_water, 'has_more': has_more}).encode())
+    
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
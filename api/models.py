@@ -1,34 +0,0 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
-import os
-
-Base = declarative_base()
-
-class Expense(Base):
-    __tablename__ = "expenses"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    idempotency_key = Column(String, unique=True, nullable=False, index=True)
-    amount_cents = Column(Integer, nullable=False)
-    category = Column(String, nullable=False)
-    description = Column(String, nullable=False)
-    date = Column(Date, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-
-# Use in-memory SQLite for Vercel (data won't persist between function calls)
-# In production, you'd want to use a persistent database like PostgreSQL
-DATABASE_URL = "sqlite:///tmp/expenses.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def create_tables():
-    Base.metadata.create_all(bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
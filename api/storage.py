@@ -1,52 +1,621 @@
+import atexit
+import bisect
+import fcntl
+import hashlib
 import json
+import math
+import mmap
+import operator
 import os
+import struct
+import time
+from array import array
+from datetime import datetime
 
-STORAGE_FILE = '/tmp/expenses.json'
+# Append-only NDJSON log: one expense per line, never rewritten in place except by compaction
+STORAGE_FILE = os.getenv('EXPENSES_LOG_FILE', '/tmp/expenses.ndjson')
+LEGACY_STORAGE_FILE = '/tmp/expenses.json'
 
-def load_expenses():
-    if os.path.exists(STORAGE_FILE):
-        with open(STORAGE_FILE, 'r') as f:
-            return json.load(f)
-    return []
+# fsync after this many appends or this many seconds, whichever comes first
+FSYNC_EVERY = int(os.getenv('EXPENSES_FSYNC_EVERY', '16'))
+FSYNC_INTERVAL = float(os.getenv('EXPENSES_FSYNC_INTERVAL', '1.0'))
+
+# Sidecar read index: one packed row per record in log order, plus orderings of their positions
+INDEX_FILE = STORAGE_FILE + '.idx'
+
+# Row: offset, line length, id, idempotency key digest, date, created_at, category. Longer values
+# are truncated to the field, which only makes ties among them fall back to id order; filters
+# re-check the record.
+DATE_WIDTH, CREATED_AT_WIDTH, CATEGORY_WIDTH = 10, 32, 32
+INDEX_ROW = struct.Struct(f'<qIqq{DATE_WIDTH}s{CREATED_AT_WIDTH}s{CATEGORY_WIDTH}s')
+
+# Sidecar layout: header (magic, log inode, base rows), the base rows, each ordering of the base
+# rows as int32 positions, then rows appended since in log order. Appending never rewrites it.
+INDEX_HEADER = struct.Struct('<8sQQ')
+INDEX_MAGIC = b'EXPIDX2\n'
+
+# Each ordering sorts positions by these row fields; ids and offsets keep ties in log order
+ORDERINGS = {'by_date': (4, 2), 'by_created_at': (5, 2), 'by_category': (6, 0)}
+
+# The sidecar is rewritten with the appended rows sorted in once they outnumber this share of
+# its base, so a cold start merges only a short unsorted tail
+INDEX_TAIL_MIN = 1024
+INDEX_TAIL_RATIO = 1 / 16
+
+# Bytes of log parsed per batch when indexing; bounds memory on a cold load
+SCAN_CHUNK_BYTES = 4 * 1024 * 1024
+
+# Compact once skipped lines (torn writes, duplicate keys) reach this share of the log
+COMPACT_MIN_GARBAGE = 100
+COMPACT_GARBAGE_RATIO = 0.1
+
+# In-process view of the log, extended lazily from the last offset this process has read.
+# Module state survives between warm invocations, so only a cold start reads the whole log.
+_state = {
+    'inode': None,
+    'signature': None,  # log (inode, size, mtime) when last caught up
+    'size': 0,        # bytes of complete lines indexed so far
+    'count': 0,       # live records, which is also the highest id
+    'garbage': 0,     # lines skipped while indexing
+    'keys': {},       # idempotency_key -> byte offset of its record
+    'keyless': [],    # byte offsets of records written without an idempotency key
+}
+_unsynced = {'appends': 0, 'since': time.monotonic()}
+
+def _reset_state(inode):
+    _state.update(inode=inode, signature=None, size=0, count=0, garbage=0, keys={}, keyless=[])
+
+def _signature(stat):
+    """A warm cache built from the log is current for as long as this is unchanged"""
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+def _is_stale(cache, stat, covered):
+    """Whether a cache covering the first covered bytes of the log must be rebuilt rather than extended"""
+    return (
+        cache['inode'] != stat.st_ino       # first use, or the log was compacted and replaced
+        or covered > stat.st_size           # truncated
+        or (covered == stat.st_size and cache.get('signature') not in (None, _signature(stat)))  # rewritten in place
+    )
 
-def save_expenses(expenses):
-    with open(STORAGE_FILE, 'w') as f:
-        json.dump(expenses, f)
+def _decode_line(line):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+def _decode_lines(lines):
+    """Parse log lines; None for any that is not a JSON object"""
+    try:
+        # One parse for the whole batch is several times faster than one per line
+        records = json.loads(b'[' + b','.join(lines) + b']')
+    except ValueError:
+        records = None
+    if records is None or len(records) != len(lines):
+        return [_decode_line(line) for line in lines]
+    return [record if isinstance(record, dict) else None for record in records]
+
+def _scan(f, offset):
+    """Yield (offset, end offset, record or None) for each complete line of the log from offset on"""
+    f.seek(offset)
+    while True:
+        lines = f.readlines(SCAN_CHUNK_BYTES)
+        if not lines:
+            return
+        torn = not lines[-1].endswith(b'\n')
+        if torn:
+            lines.pop()  # torn write at the tail; repaired by the next append
+        for line, record in zip(lines, _decode_lines(lines)):
+            yield offset, offset + len(line), record
+            offset += len(line)
+        if torn:
+            return
+
+def _catch_up(f):
+    """Index any records appended to the log since this process last looked"""
+    stat = os.fstat(f.fileno())
+    signature = _signature(stat)
+    if signature == _state['signature']:
+        return
+    if _is_stale(_state, stat, _state['size']):
+        _reset_state(stat.st_ino)
+    
+    for offset, end, record in _scan(f, _state['size']):
+        key = record.get('idempotency_key') if record is not None else None
+        if record is None or key in _state['keys']:
+            _state['garbage'] += 1
+        else:
+            # Records from before keys were required have none; they are live and never duplicates
+            if key is None:
+                _state['keyless'].append(offset)
+            else:
+                _state['keys'][key] = offset
+            _state['count'] += 1
+        _state['size'] = end
+    _state['signature'] = signature
+
+def _read_record(f, offset):
+    f.seek(offset)
+    return json.loads(f.readline())
+
+def _migrate_legacy_file():
+    """Convert the old whole-file JSON array into the log format, once"""
+    if os.path.exists(STORAGE_FILE) or not os.path.exists(LEGACY_STORAGE_FILE):
+        return
+    with open(LEGACY_STORAGE_FILE, 'r') as f:
+        expenses = json.load(f)
+    tmp_path = STORAGE_FILE + '.migrate'
+    with open(tmp_path, 'w') as f:
+        for expense in expenses:
+            f.write(json.dumps(expense) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        # link() fails if another process migrated first, so only one copy wins
+        os.link(tmp_path, STORAGE_FILE)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp_path)
+
+def _open_locked(lock_type):
+    """Open the current log file and lock it, retrying if compaction swaps it underneath us"""
+    _migrate_legacy_file()
+    while True:
+        f = open(STORAGE_FILE, 'a+b')
+        fcntl.flock(f, lock_type)
+        if os.fstat(f.fileno()).st_ino == os.stat(STORAGE_FILE).st_ino:
+            return f
+        f.close()
+
+def _maybe_fsync(f):
+    _unsynced['appends'] += 1
+    if _unsynced['appends'] >= FSYNC_EVERY or time.monotonic() - _unsynced['since'] >= FSYNC_INTERVAL:
+        os.fsync(f.fileno())
+        _unsynced.update(appends=0, since=time.monotonic())
+
+@atexit.register
+def sync():
+    """Flush appends still waiting for a batched fsync to disk"""
+    if _unsynced['appends'] and os.path.exists(STORAGE_FILE):
+        with open(STORAGE_FILE, 'rb') as f:
+            os.fsync(f.fileno())
+        _unsynced.update(appends=0, since=time.monotonic())
+
+def load_expenses():
+    if not os.path.exists(STORAGE_FILE) and not os.path.exists(LEGACY_STORAGE_FILE):
+        return []
+    f = _open_locked(fcntl.LOCK_SH)
+    try:
+        f.seek(0)
+        expenses = []
+        seen = set()
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                expense = json.loads(line)
+            except ValueError:
+                continue
+            key = expense.get('idempotency_key')
+            if key is None or key not in seen:
+                seen.add(key)
+                expenses.append(expense)
+        return expenses
+    finally:
+        f.close()
 
 def add_expense(expense_data):
-    expenses = load_expenses()
-    
-    # Check for existing expense with same idempotency key
-    existing = next((e for e in expenses if e.get('idempotency_key') == expense_data.get('idempotency_key')), None)
-    if existing:
-        return existing
-    
-    # Create new expense
-    expense = {
-        'id': len(expenses) + 1,
-        'idempotency_key': expense_data.get('idempotency_key'),
-        'amount_cents': int(expense_data['amount'] * 100),
-        'category': expense_data['category'],
-        'description': expense_data['description'],
-        'date': expense_data['date'],
-        'created_at': expense_data.get('created_at')
+    """Append an expense, or return the one already stored under its idempotency key"""
+    if expense_data.get('idempotency_key') is None:
+        raise ValueError('idempotency_key is required')
+    f = _open_locked(fcntl.LOCK_EX)
+    try:
+        _catch_up(f)
+        
+        # Check for existing expense with same idempotency key
+        offset = _state['keys'].get(expense_data.get('idempotency_key'))
+        if offset is not None:
+            return _read_record(f, offset)
+        
+        # Drop a torn line left by a crashed writer so our record starts on its own line
+        if os.fstat(f.fileno()).st_size > _state['size']:
+            f.truncate(_state['size'])
+        
+        # Create new expense
+        expense = {
+            'id': _state['count'] + 1,
+            'idempotency_key': expense_data.get('idempotency_key'),
+            'amount_cents': int(expense_data['amount'] * 100),
+            'category': expense_data['category'],
+            'description': expense_data['description'],
+            'date': expense_data['date'],
+            'created_at': expense_data.get('created_at') or datetime.now().isoformat()
+        }
+        
+        line = (json.dumps(expense) + '\n').encode()
+        f.write(line)
+        f.flush()
+        _maybe_fsync(f)
+        
+        _state['keys'][expense['idempotency_key']] = _state['size']
+        _state['size'] += len(line)
+        _state['count'] += 1
+        _state['signature'] = _signature(os.fstat(f.fileno()))
+        
+        if _state['garbage'] >= max(COMPACT_MIN_GARBAGE, COMPACT_GARBAGE_RATIO * _state['count']):
+            _compact(f)
+        return expense
+    finally:
+        f.close()
+
+def compact():
+    """Rewrite the log without torn lines or repeated idempotency keys; every live record is kept"""
+    f = _open_locked(fcntl.LOCK_EX)
+    try:
+        _catch_up(f)
+        _compact(f)
+    finally:
+        f.close()
+
+def _compact(f):
+    # Caller holds the exclusive lock; readers see either the old file or the new one
+    tmp_path = STORAGE_FILE + '.compact'
+    with open(tmp_path, 'wb') as out:
+        for offset in sorted([*_state['keys'].values(), *_state['keyless']]):
+            f.seek(offset)
+            out.write(f.readline())
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, STORAGE_FILE)
+    _unsynced.update(appends=0, since=time.monotonic())
+    _reset_state(None)
+
+def _empty_index(inode):
+    return {
+        'inode': inode,
+        'signature': None,             # log (inode, size, mtime) the index was last brought up to date with
+        'size': 0,                     # bytes of the log covered by the index
+        'count': 0,                    # records indexed; a record's position is its row number
+        'rows': bytearray(),           # INDEX_ROW for each position
+        'by_date': array('i'),         # positions by (date, id)
+        'by_created_at': array('i'),   # positions by (created_at, id)
+        'by_category': array('i'),     # positions by (category, offset)
+        'keys': None,                  # key digest -> position, built from the rows when first extended
     }
+
+_index = {'current': None}
+
+def _field(value, width):
+    """A string as stored in an index row, for comparing against row keys"""
+    return value.encode()[:width].ljust(width, b'\0')
+
+def _sort_key(index, ordering):
+    pick = operator.itemgetter(*ORDERINGS[ordering])
+    rows, size = index['rows'], INDEX_ROW.size
+    return lambda position: pick(INDEX_ROW.unpack_from(rows, position * size))
+
+def _key_digest(key):
+    """Stable 64-bit digest of an idempotency key for index rows; 0 for a record without one"""
+    if key is None:
+        return 0
+    digest = int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), 'little', signed=True)
+    return digest or 1
+
+def _indexed_keys(index):
+    if index['keys'] is None:
+        digests = map(operator.itemgetter(3), INDEX_ROW.iter_unpack(index['rows']))
+        index['keys'] = dict(zip(digests, range(index['count'])))
+        index['keys'].pop(0, None)
+    return index['keys']
+
+def _record(log, index, position):
+    offset, length = INDEX_ROW.unpack_from(index['rows'], position * INDEX_ROW.size)[:2]
+    return json.loads(log[offset:offset + length])
+
+def _merge(index, positions):
+    """Sort new positions into each ordering, splicing them in between bisected runs"""
+    for name in ORDERINGS:
+        key = _sort_key(index, name)
+        ordering = index[name]
+        if not ordering:
+            index[name] = array('i', sorted(positions, key=key))
+            continue
+        merged, start = array('i'), 0
+        for position in sorted(positions, key=key):
+            end = bisect.bisect_left(ordering, key(position), start, key=key)
+            merged += ordering[start:end]
+            merged.append(position)
+            start = end
+        merged += ordering[start:]
+        index[name] = merged
+
+def _tail_start(base):
+    """Sidecar offset of the rows appended after a base of this many rows and its orderings"""
+    return INDEX_HEADER.size + base * (INDEX_ROW.size + len(ORDERINGS) * array('i').itemsize)
+
+def _read_index(f, stat):
+    """The sidecar's index if it was built from this log, its unsorted tail merged in; else None"""
+    try:
+        with open(INDEX_FILE, 'rb') as idx:
+            data = idx.read()
+        magic, inode, base = INDEX_HEADER.unpack_from(data)
+    except (OSError, struct.error):
+        return None
+    rows_end = INDEX_HEADER.size + base * INDEX_ROW.size
+    tail_start = _tail_start(base)
+    if magic != INDEX_MAGIC or inode != stat.st_ino or len(data) < tail_start:
+        return None
+    # A row torn by a crashed writer is ignored and overwritten by the next append
+    tail = (len(data) - tail_start) // INDEX_ROW.size
+    index = _empty_index(inode)
+    index['rows'] += data[INDEX_HEADER.size:rows_end]
+    index['rows'] += data[tail_start:tail_start + tail * INDEX_ROW.size]
+    index['count'] = base + tail
+    span = base * array('i').itemsize
+    for n, name in enumerate(ORDERINGS):
+        index[name].frombytes(data[rows_end + n * span:rows_end + (n + 1) * span])
+    if index['count']:
+        # The last row must still describe the log's record, else the log was rewritten in place
+        offset, length, expense_id = INDEX_ROW.unpack_from(index['rows'], (index['count'] - 1) * INDEX_ROW.size)[:3]
+        f.seek(offset)
+        line = f.read(length + 1)
+        record = _decode_line(line) if line.endswith(b'\n') else None
+        if record is None or record.get('id', 0) != expense_id:
+            return None
+        index['size'] = offset + length + 1
+    _merge(index, range(base, index['count']))
+    return index
+
+def _rewrite_index(index):
+    # Publish atomically; readers see either the old sidecar or the new one
+    tmp_path = f'{INDEX_FILE}.{os.getpid()}'
+    with open(tmp_path, 'wb') as idx:
+        idx.write(INDEX_HEADER.pack(INDEX_MAGIC, index['inode'], index['count']))
+        idx.write(index['rows'])
+        for name in ORDERINGS:
+            idx.write(index[name].tobytes())
+    os.replace(tmp_path, INDEX_FILE)
+
+def _write_index(index):
+    """Append the rows the sidecar lacks, or rewrite it once its unsorted tail grows too long"""
+    try:
+        idx = open(INDEX_FILE, 'r+b')
+    except FileNotFoundError:
+        _rewrite_index(index)
+        return
+    with idx:
+        fcntl.flock(idx, fcntl.LOCK_EX)
+        try:
+            if os.fstat(idx.fileno()).st_ino != os.stat(INDEX_FILE).st_ino:
+                return  # replaced by another process while we waited for the lock
+            magic, inode, base = INDEX_HEADER.unpack(idx.read(INDEX_HEADER.size))
+        except (OSError, struct.error):
+            magic = inode = base = None
+        size = os.fstat(idx.fileno()).st_size
+        if magic != INDEX_MAGIC or inode != index['inode'] or size < _tail_start(base):
+            _rewrite_index(index)  # built for an earlier log, or an older format
+            return
+        tail_start = _tail_start(base)
+        written = base + (size - tail_start) // INDEX_ROW.size
+        if written >= index['count']:
+            return
+        if index['count'] - base > max(INDEX_TAIL_MIN, INDEX_TAIL_RATIO * base):
+            _rewrite_index(index)
+            return
+        idx.truncate(tail_start + (written - base) * INDEX_ROW.size)
+        idx.seek(0, os.SEEK_END)
+        idx.write(index['rows'][written * INDEX_ROW.size:])
+
+def _load_index(f):
+    """Return the read index for the open log, extending it with any records appended since"""
+    stat = os.fstat(f.fileno())
+    signature = _signature(stat)
+    index = _index['current']
+    if index is not None and index['signature'] == signature:
+        return index  # warm invocation and the log has not changed
+    if index is not None and _is_stale(index, stat, index['size']):
+        index = None
+    if index is None:
+        # Cold start: reuse the sidecar written by earlier invocations if it matches this log
+        index = _read_index(f, stat) or _empty_index(stat.st_ino)
+    
+    if index['size'] < stat.st_size:
+        rows, indexed = index['rows'], index['count']
+        keys = _indexed_keys(index)
+        for start, end, expense in _scan(f, index['size']):
+            index['size'] = end
+            if expense is None:
+                continue
+            # Only the first record under a key is live, as in _catch_up; a racing writer's copy is not listed
+            key = expense.get('idempotency_key')
+            digest = _key_digest(key)
+            if digest in keys:
+                offset, length = INDEX_ROW.unpack_from(rows, keys[digest] * INDEX_ROW.size)[:2]
+                # pread leaves the file position _scan is reading from alone
+                if json.loads(os.pread(f.fileno(), length, offset)).get('idempotency_key') == key:
+                    continue
+            elif digest:
+                keys[digest] = len(rows) // INDEX_ROW.size
+            rows += INDEX_ROW.pack(
+                start, end - start - 1, expense.get('id', 0), digest, (expense.get('date') or '').encode(),
+                (expense.get('created_at') or '').encode(), (expense.get('category') or '').encode(),
+            )
+        index['count'] = len(rows) // INDEX_ROW.size
+        if index['count'] > indexed:
+            _merge(index, range(indexed, index['count']))
+            _write_index(index)
     
-    expenses.append(expense)
-    save_expenses(expenses)
-    return expense
+    index['signature'] = signature
+    _index['current'] = index
+    return index
 
-def get_expenses(category=None, sort_param=None):
-    expenses = load_expenses()
+def _matches(expense, date_from, date_to, min_cents, max_cents, description_prefix):
+    day = expense.get('date') or ''
+    amount = expense.get('amount_cents', 0)
+    return (
+        (date_from is None or day >= date_from)
+        and (date_to is None or day <= date_to)
+        and (min_cents is None or amount >= min_cents)
+        and (max_cents is None or amount <= max_cents)
+        and (description_prefix is None or (expense.get('description') or '').startswith(description_prefix))
+    )
+
+def get_expenses(categories=None, sort_param=None, limit=None, after=None, date_from=None, date_to=None,
+                 min_cents=None, max_cents=None, description_prefix=None):
+    """
+    Return (page, last_key); after is the (sort value, id) key of the previous page's last row.
+    
+    categories is a list of categories to include; dates are ISO strings, both bounds inclusive.
+    """
+    if not os.path.exists(STORAGE_FILE) and not os.path.exists(LEGACY_STORAGE_FILE):
+        return [], None
     
-    # Filter by category
-    if category:
-        expenses = [e for e in expenses if e.get('category') == category]
+    f = _open_locked(fcntl.LOCK_SH)
+    try:
+        index = _load_index(f)
+        by_date = sort_param == 'date_desc'
+        name, field, width = ('by_date', 'date', DATE_WIDTH) if by_date else ('by_created_at', 'created_at', CREATED_AT_WIDTH)
+        ordering, key = index[name], _sort_key(index, name)
+        if not ordering:
+            return [], None
+        
+        # Narrow a date ordering to the requested range up front
+        start, end = 0, len(ordering)
+        if by_date and date_from:
+            start = bisect.bisect_left(ordering, (_field(date_from, DATE_WIDTH),), key=key)
+        if by_date and date_to:
+            end = bisect.bisect_right(ordering, (_field(date_to, DATE_WIDTH), math.inf), key=key)
+        # Resume strictly after the previous page: everything before its key in the ordering
+        if after:
+            value, expense_id = after
+            end = min(end, bisect.bisect_left(ordering, (_field(value, width), expense_id), key=key))
+        
+        # Filter by category: each one is a run of the category ordering
+        wanted = None
+        check_category = False
+        if categories:
+            wanted = set()
+            by_category, category_key = index['by_category'], _sort_key(index, 'by_category')
+            for category in categories:
+                stored = _field(category, CATEGORY_WIDTH)
+                wanted.update(by_category[
+                    bisect.bisect_left(by_category, (stored,), key=category_key):
+                    bisect.bisect_right(by_category, (stored, math.inf), key=category_key)
+                ])
+                # A truncated name may share its run with another category
+                check_category = check_category or len(category.encode()) >= CATEGORY_WIDTH
+        
+        # Remaining filters need the record itself
+        check_record = any(value is not None for value in (date_from, date_to, min_cents, max_cents, description_prefix))
+        
+        with mmap.mmap(f.fileno(), index['size'], access=mmap.ACCESS_READ) as log:
+            # Walk the ordering newest first, stopping one past the page to detect a next page
+            expenses = []
+            for position in reversed(ordering[start:end]):
+                if wanted is not None and position not in wanted:
+                    continue
+                # Slice only the selected records out of the mapped log
+                expense = _record(log, index, position)
+                if check_category and expense.get('category') not in categories:
+                    continue
+                if check_record and not _matches(expense, date_from, date_to, min_cents, max_cents, description_prefix):
+                    continue
+                expenses.append(expense)
+                if limit is not None and len(expenses) > limit:
+                    break
+        
+        last_key = None
+        if limit is not None and len(expenses) > limit:
+            expenses = expenses[:limit]
+            last_key = (expenses[-1].get(field) or '', expenses[-1].get('id', 0))
+        return expenses, last_key
+    finally:
+        f.close()
+
+def get_changes(since=None, limit=None):
+    """
+    Return (expenses, high_water, has_more): records with an id after since, oldest first.
+    
+    Ids are assigned in append order, so they double as the change sequence. Without
+    since, no records are returned, only the current high-water mark. Reads the same
+    index as get_expenses, so a later copy of an idempotency key is never sent.
+    """
+    if not os.path.exists(STORAGE_FILE) and not os.path.exists(LEGACY_STORAGE_FILE):
+        return [], since or 0, False
+    
+    f = _open_locked(fcntl.LOCK_SH)
+    try:
+        index = _load_index(f)
+        count = index['count']
+        if not count:
+            return [], since or 0, False
+        
+        with mmap.mmap(f.fileno(), index['size'], access=mmap.ACCESS_READ) as log:
+            if since is None:
+                return [], _record(log, index, count - 1).get('id', 0), False
+            
+            # A record never sits before position id - 1, so records after since start at position since
+            expenses = []
+            for position in range(min(since, count), count):
+                expense = _record(log, index, position)
+                if expense.get('id', 0) <= since:
+                    continue
+                expenses.append(expense)
+                if limit is not None and len(expenses) > limit:
+                    break
+        
+        has_more = limit is not None and len(expenses) > limit
+        if has_more:
+            expenses = expenses[:limit]
+        return expenses, expenses[-1]['id'] if expenses else since, has_more
+    finally:
+        f.close()
+
+def log_size():
+    try:
+        return os.path.getsize(STORAGE_FILE)
+    except OSError:
+        return 0
+
+def wait_for_append(size, timeout, interval=0.1):
+    """Sleep until the log changes size or timeout seconds pass; only stats the file"""
+    deadline = time.monotonic() + timeout
+    while log_size() == size and time.monotonic() < deadline:
+        time.sleep(interval)
+
+def summarize_expenses(category=None):
+    """Aggregate count and total per category and per month in one pass, streaming the log in batches"""
+    by_category = {}
+    by_month = {}
     
-    # Sort expenses
-    if sort_param == 'date_desc':
-        expenses = sorted(expenses, key=lambda x: x.get('date', ''), reverse=True)
-    else:
-        expenses = sorted(expenses, key=lambda x: x.get('created_at', ''), reverse=True)
+    if os.path.exists(STORAGE_FILE) or os.path.exists(LEGACY_STORAGE_FILE):
+        f = _open_locked(fcntl.LOCK_SH)
+        try:
+            _catch_up(f)
+            for offset, _, e in _scan(f, 0):
+                # The key map points at the first record under each key; later copies are duplicates
+                key = e.get('idempotency_key') if e is not None else None
+                if e is None or (key is not None and _state['keys'].get(key) != offset):
+                    continue
+                if category and e.get('category') != category:
+                    continue
+                amount = e.get('amount_cents', 0)
+                for groups, group in ((by_category, e.get('category')), (by_month, (e.get('date') or '')[:7])):
+                    count, total = groups.get(group, (0, 0))
+                    groups[group] = (count + 1, total + amount)
+        finally:
+            f.close()
     
-    return expenses
\ No newline at end of file
+    return {
+        'count': sum(count for count, _ in by_category.values()),
+        'total_cents': sum(total for _, total in by_category.values()),
+        'by_category': [
+            {'category': name, 'count': count, 'total_cents': total}
+            for name, (count, total) in sorted(by_category.items())
+        ],
+        'by_month': [
+            {'month': month, 'count': count, 'total_cents': total}
+            for month, (count, total) in sorted(by_month.items())
+        ],
+    }
\ No newline at end of file
@@ -0,0 +1,35 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+
+# Shared storage lives next to the handlers. It is imported on first use, so a preflight
+# OPTIONS never loads it, and stays loaded with its warm cache across warm invocations.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        import storage
+        
+        params = parse_qs(urlparse(self.path).query)
+        category = params.get('category', [None])[0]
+        
+        # Same shape as the backend's GET /expenses/summary, aggregated in one pass over the log
+        summary = storage.summarize_expenses(category)
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+        
+        self.wfile.write(json.dumps(summary).encode())
+    
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
\ No newline at end of file
@@ -0,0 +1,247 @@
+"""
+In-memory column store behind the /analytics endpoints.
+
+The columns reports need (date as int64 days since 1970-01-01, category
+code, amount_cents) are loaded once into NumPy arrays and grouped with
+vectorized reductions (bincount, cumsum, sort), so a report over millions
+of expenses never builds a Python object per row. Before each report the
+store reads only the rows past its change_seq high-water mark, the same
+feed GET /expenses/changes serves, so new expenses from any process are
+picked up with one indexed query.
+
+NumPy is optional: without it ANALYTICS_ENABLED is False and the
+endpoints answer 503.
+"""
+
+import logging
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+from models import Expense
+
+try:
+    import numpy as np
+except ImportError:  # analytics endpoints are disabled without numpy
+    np = None
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_ENABLED = np is not None
+LOAD_CHUNK_ROWS = 100000
+MAX_ROLLING_DAYS = 3660  # longest date range /analytics/rolling returns day by day
+EPOCH = date(1970, 1, 1)
+
+def to_days(day):
+    return (day - EPOCH).days
+
+def from_days(days):
+    return EPOCH + timedelta(days=int(days))
+
+class ColumnStore:
+    """Append-only columns of every expense, extended from the change feed"""
+
+    def __init__(self):
+        self.size = 0
+        self.high_water = 0
+        self.categories = []  # code -> name
+        self._codes = {}      # name -> code
+        self._days = self._category_codes = self._amounts = None
+        self._lock = threading.Lock()
+
+    def _reserve(self, rows):
+        # Grow geometrically, so appending one expense at a time stays amortized O(1)
+        capacity = 0 if self._days is None else len(self._days)
+        if self.size + rows <= capacity:
+            return
+        capacity = max(1024, 2 * capacity, self.size + rows)
+        for name, dtype in (("_days", np.int64), ("_category_codes", np.int32), ("_amounts", np.int64)):
+            grown = np.empty(capacity, dtype=dtype)
+            if self.size:
+                grown[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, grown)
+
+    def _append(self, rows):
+        seqs, days, categories, amounts = zip(*rows)
+        # Code each distinct category once per chunk instead of once per row
+        names, inverse = np.unique(np.array(categories, dtype=object), return_inverse=True)
+        lookup = np.array([self._codes.setdefault(name, len(self._codes)) for name in names], dtype=np.int32)
+        self.categories = sorted(self._codes, key=self._codes.get)
+
+        self._reserve(len(rows))
+        end = self.size + len(rows)
+        self._days[self.size:end] = np.array(days, dtype="datetime64[D]").astype(np.int64)
+        self._category_codes[self.size:end] = lookup[inverse]
+        self._amounts[self.size:end] = np.array(amounts, dtype=np.int64)
+        self.size = end
+        self.high_water = seqs[-1]
+
+    def refresh(self, db):
+        """Load expenses committed since the last refresh; returns how many were added"""
+        with self._lock:
+            started = time.perf_counter()
+            before = self.size
+            result = db.execute(
+                select(Expense.change_seq, Expense.date, Expense.category, Expense.amount_cents)
+                .where(Expense.change_seq > self.high_water)
+                .order_by(Expense.change_seq)
+                .execution_options(yield_per=LOAD_CHUNK_ROWS)
+            )
+            for rows in result.partitions():
+                self._append(rows)
+            added = self.size - before
+            if added > LOAD_CHUNK_ROWS:
+                logger.info(f"Loaded {added} expenses into the analytics store in {time.perf_counter() - started:.2f}s")
+            return added
+
+    def columns(self, filters=None):
+        """(days, category codes, amounts) views of the expenses matching filters"""
+        with self._lock:
+            days = self._days[:self.size] if self.size else np.empty(0, dtype=np.int64)
+            codes = self._category_codes[:self.size] if self.size else np.empty(0, dtype=np.int32)
+            amounts = self._amounts[:self.size] if self.size else np.empty(0, dtype=np.int64)
+            known = dict(self._codes)
+        if filters is None:
+            return days, codes, amounts
+
+        mask = np.ones(len(days), dtype=bool)
+        if filters.categories:
+            wanted = [known[name] for name in filters.categories if name in known]
+            mask &= np.isin(codes, wanted)
+        if filters.date_from is not None:
+            mask &= days >= to_days(filters.date_from)
+        if filters.date_to is not None:
+            mask &= days <= to_days(filters.date_to)
+        if filters.min_cents is not None:
+            mask &= amounts >= filters.min_cents
+        if filters.max_cents is not None:
+            mask &= amounts <= filters.max_cents
+        return days[mask], codes[mask], amounts[mask]
+
+column_store = ColumnStore()
+
+def period_index(days, granularity):
+    """Map days since the epoch to day, ISO week (Monday start) or calendar month numbers"""
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        return (days + 3) // 7
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+def period_label(period, granularity):
+    if granularity == "day":
+        return from_days(period).isoformat()
+    if granularity == "week":
+        return from_days(period * 7 - 3).isoformat()
+    return f"{1970 + period // 12:04d}-{period % 12 + 1:02d}"
+
+def grouped_totals(codes, periods, amounts):
+    """
+    Count and total per (category, period) pair present, ordered by category then period;
+    returns (codes, periods, counts, totals). Memory follows the number of rows, not the
+    span of periods they cover.
+    """
+    first = int(periods.min())
+    span = int(periods.max()) - first + 1
+    keys, groups = np.unique(codes.astype(np.int64) * span + (periods - first), return_inverse=True)
+    counts = np.bincount(groups, minlength=len(keys))
+    # float64 weights are exact for totals below 2**53 cents
+    totals = np.rint(np.bincount(groups, weights=amounts, minlength=len(keys))).astype(np.int64)
+    return keys // span, keys % span + first, counts, totals
+
+def spend_series(filters, granularity):
+    """Count and total per category and period, for periods with at least one expense"""
+    days, codes, amounts = column_store.columns(filters)
+    if not len(days):
+        return []
+    groups = grouped_totals(codes, period_index(days, granularity), amounts)
+    return [
+        {
+            "category": column_store.categories[code],
+            "period": period_label(period, granularity),
+            "count": count,
+            "total_cents": total,
+        }
+        for code, period, count, total in zip(*(column.tolist() for column in groups))
+    ]
+
+def rolling_average(filters, window):
+    """
+    Daily totals with the trailing window-day average, for every day in the filtered range.
+    Raises ValueError when that range is longer than MAX_ROLLING_DAYS.
+    """
+    days, _, amounts = column_store.columns(filters)
+    if not len(days):
+        return []
+    first = int(days.min())
+    if int(days.max()) - first >= MAX_ROLLING_DAYS:
+        raise ValueError(f"Expenses span more than {MAX_ROLLING_DAYS} days; narrow them with date_from and date_to")
+    daily = np.rint(np.bincount(days - first, weights=amounts)).astype(np.int64)
+    # Sum over the trailing window from a running total; the first days average what exists
+    running = np.concatenate(([0], np.cumsum(daily)))
+    ends = np.arange(1, len(daily) + 1)
+    starts = np.maximum(ends - window, 0)
+    averages = (running[ends] - running[starts]) / (ends - starts)
+    return [
+        {"date": from_days(first + offset).isoformat(), "total_cents": total, "rolling_avg_cents": round(average, 2)}
+        for offset, (total, average) in enumerate(zip(daily.tolist(), averages.tolist()))
+    ]
+
+def amount_percentiles(filters, points):
+    """Percentiles of amount_cents overall (category None) and per category"""
+    _, codes, amounts = column_store.columns(filters)
+    if not len(amounts):
+        return []
+    rows = [(None, amounts)]
+    # One sort groups every category's amounts into a contiguous run
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    present, starts = np.unique(sorted_codes, return_index=True)
+    ends = np.append(starts[1:], len(sorted_codes))
+    for code, start, end in zip(present.tolist(), starts.tolist(), ends.tolist()):
+        rows.append((column_store.categories[code], amounts[order[start:end]]))
+    return [
+        {
+            "category": category,
+            "count": len(values),
+            "percentiles": {
+                f"p{point:g}": round(value, 2)
+                for point, value in zip(points, np.percentile(values, points).tolist())
+            },
+        }
+        for category, values in rows
+    ]
+
+def year_over_year(filters, year=None):
+    """Monthly totals per category for year (default: the latest year with expenses) against the year before"""
+    days, codes, amounts = column_store.columns(filters)
+    if not len(days):
+        return None, []
+    months = period_index(days, "month")
+    years = months // 12
+    if year is None:
+        year = 1970 + int(years.max())
+    in_range = (years == year - 1970) | (years == year - 1971)
+    if not in_range.any():
+        return year, []
+    group_codes, group_months, _, group_totals = grouped_totals(codes[in_range], months[in_range], amounts[in_range])
+    totals = dict(zip(zip(group_codes.tolist(), group_months.tolist()), group_totals.tolist()))
+    base = (year - 1970) * 12
+    results = []
+    for code, category in enumerate(column_store.categories):
+        for month in range(12):
+            total = totals.get((code, base + month), 0)
+            previous_total = totals.get((code, base + month - 12), 0)
+            if not total and not previous_total:
+                continue
+            results.append({
+                "category": category,
+                "month": f"{year:04d}-{month + 1:02d}",
+                "total_cents": total,
+                "previous_total_cents": previous_total,
+                "change_pct": round((total - previous_total) / previous_total * 100, 2) if previous_total else None,
+            })
+    return year, results
@@ -0,0 +1,119 @@
+"""
+In-process LRU cache of serialized GET /expenses responses.
+
+Entries and ETags are keyed by the normalized query plus the change feed's
+high-water mark (changes.high_water), read from the database on every
+request. Every insert advances it, whichever process made it (another
+uvicorn worker, `python ingest.py`), so a page cached before a write can
+never be served after it. Writes made with raw SQL that leave
+change_counter alone are not seen.
+
+The generation counter only tracks writes committed by this process; it
+drops their pages early and wakes GET /expenses/changes long-polls.
+"""
+
+from collections import OrderedDict
+import asyncio
+import hashlib
+import os
+import threading
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+def wake(future):
+    if not future.done():
+        future.set_result(None)
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.generation = 0
+        self.high_water = 0  # newest change feed mark seen; older entries are dropped
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+        self._entries = OrderedDict()
+        self._waiters = []  # (loop, future) of requests waiting for the next write
+        self._lock = threading.Lock()
+
+    def key(self, high_water, params):
+        """Cache key for a query against the database as of change feed mark high_water"""
+        with self._lock:
+            if high_water > self.high_water:
+                # Another process wrote since: nothing cached before it can be served again
+                self.high_water = high_water
+                self._entries.clear()
+        return (high_water, params)
+
+    def etag(self, key):
+        high_water, params = key
+        digest = hashlib.sha1(repr(params).encode()).hexdigest()[:16]
+        return f'"{high_water}-{digest}"'
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def put(self, key, entry):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            # A newer write was seen while this page was being built
+            if key[0] < self.high_water:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump(self):
+        """Invalidate every cached page; call after committing a write"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            waiters, self._waiters = self._waiters, []
+        # Writes commit on worker threads; wake each waiter on its own event loop
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(wake, future)
+
+    async def wait_for_write(self, generation, timeout):
+        """Wait until a write moves the generation past generation, or until timeout seconds pass"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self.generation != generation:
+                return
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "not_modified": self.not_modified,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "generation": self.generation,
+                "high_water": self.high_water,
+            }
+
+expense_cache = ResponseCache()
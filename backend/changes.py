@@ -0,0 +1,42 @@
+"""
+Change feed: every inserted expense gets a change_seq that increases in commit order.
+
+Writers take their sequence numbers from the single change_counter row.
+The UPDATE locks that row until the transaction ends, so on PostgreSQL a
+transaction that reserved lower numbers always commits before one holding
+higher numbers, and a client that has seen sequence N never misses a row
+numbered at or below it. Writers insert with no number and reserve it as
+the last statement before commit, so concurrent writers queue on the
+counter only for the commit itself. SQLite runs one writer at a time
+anyway. Numbers reserved by a transaction that rolls back are returned
+with it.
+"""
+
+from sqlalchemy import select, update
+
+from models import ChangeCounter, Expense
+
+def next_change_seq(db, count=1):
+    """Reserve count sequence numbers in the current transaction; returns the first"""
+    last = db.scalar(
+        update(ChangeCounter)
+        .where(ChangeCounter.id == 1)
+        .values(seq=ChangeCounter.seq + count)
+        .returning(ChangeCounter.seq)
+    )
+    return last - count + 1
+
+def high_water(db):
+    """The last sequence number handed out"""
+    return db.scalar(select(ChangeCounter.seq).where(ChangeCounter.id == 1)) or 0
+
+def changes_query(since, limit):
+    return select(Expense).where(Expense.change_seq > since).order_by(Expense.change_seq).limit(limit)
+
+def changes_since(db, since, limit):
+    """Expenses with change_seq after since, oldest first; returns (expenses, new high-water mark, has_more)"""
+    # One extra row tells whether the client should poll again straight away
+    expenses = db.scalars(changes_query(since, limit + 1)).all()
+    has_more = len(expenses) > limit
+    expenses = expenses[:limit]
+    return expenses, expenses[-1].change_seq if expenses else since, has_more
@@ -0,0 +1,104 @@
+"""
+Write-behind group commit for POST /expenses.
+
+With GROUP_COMMIT=1, create requests are queued to a single writer task
+that collects everything arriving within GROUP_COMMIT_WINDOW_MS (or up to
+GROUP_COMMIT_MAX_ROWS expenses) and writes it in one transaction, so the
+database syncs once per batch instead of once per expense. Each request
+waits for its own batch to commit before responding, and gets its own
+result: write_batch reports an item that failed on its own by returning
+its exception in that item's place.
+"""
+
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "").lower() in ("1", "true", "yes")
+GROUP_COMMIT_WINDOW = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2")) / 1000
+GROUP_COMMIT_MAX_ROWS = int(os.getenv("GROUP_COMMIT_MAX_ROWS", "256"))
+
+class GroupCommitWriter:
+    def __init__(self, write_batch, window=GROUP_COMMIT_WINDOW, max_rows=GROUP_COMMIT_MAX_ROWS):
+        # write_batch(items) runs in a worker thread and returns one result (or exception) per item, in order
+        self.write_batch = write_batch
+        self.window = window
+        self.max_rows = max_rows
+        self.batches = 0
+        self.rows = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Commit everything already queued, then stop the writer"""
+        await self._queue.put(None)
+        await self._task
+
+    async def submit(self, item):
+        """Queue an item and wait for the result of the batch that commits it"""
+        if self._task is None or self._task.done():
+            # Writer not running (startup or shutdown): write the item on its own
+            result = (await asyncio.to_thread(self.write_batch, [item]))[0]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self, first):
+        """Gather queued items until the window closes or the batch is full; returns (batch, stopping)"""
+        loop = asyncio.get_running_loop()
+        batch = [first]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_rows:
+            try:
+                entry = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if entry is None:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    async def _run(self):
+        while True:
+            entry = await self._queue.get()
+            if entry is None:
+                return
+            batch, stopping = await self._collect(entry)
+            await self._commit(batch)
+            if stopping:
+                return
+
+    async def _commit(self, batch):
+        try:
+            results = await asyncio.to_thread(self.write_batch, [item for item, _ in batch])
+        except Exception as e:
+            logger.exception(f"Group commit of {len(batch)} expenses failed")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.rows += sum(1 for result in results if not isinstance(result, Exception))
+        # A caller that disconnected has cancelled its future; its expense is still committed
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,253 @@
+"""
+Idempotency keys: the expiring idempotency_keys table and a process-local pre-check.
+
+A key claims its expense by inserting into idempotency_keys in the same
+transaction as the expense; the primary key rejects a second live claim.
+Rows expire after IDEMPOTENCY_TTL_HOURS and a background sweeper deletes
+them, so the index stays the size of recent traffic. Keys claimed by CSV
+imports are permanent: they never expire, so importing a file again only
+reports duplicates, and the table grows with imported rows.
+
+A bloom filter answers "has this key possibly been used?" without a query:
+a negative is definite, so new keys skip the SELECT and go straight to the
+insert, where the key's primary key remains the final check. An LRU of
+recently seen key -> ExpenseResponse mappings serves client retries from
+memory. Keys created by other processes after startup are unknown here;
+they surface as a lost insert race, which the write paths already handle.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import and_, delete, insert, or_, select
+
+from models import IDEMPOTENCY_TTL_HOURS, Expense, IdempotencyKey, SessionLocal, upsert_insert
+
+logger = logging.getLogger(__name__)
+
+BLOOM_CAPACITY = int(os.getenv("IDEMPOTENCY_BLOOM_CAPACITY", "1000000"))
+BLOOM_ERROR_RATE = float(os.getenv("IDEMPOTENCY_BLOOM_ERROR_RATE", "0.01"))
+LRU_SIZE = int(os.getenv("IDEMPOTENCY_LRU_SIZE", "10000"))
+SEED_CHUNK_ROWS = 10000
+SWEEP_INTERVAL = float(os.getenv("IDEMPOTENCY_SWEEP_INTERVAL", "300"))  # seconds
+SWEEP_BATCH_ROWS = 5000
+
+def key_cutoff():
+    """Keys created before this time have expired"""
+    return datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+
+def is_live():
+    """Condition on IdempotencyKey rows that have not expired"""
+    return or_(IdempotencyKey.permanent, IdempotencyKey.created_at >= key_cutoff())
+
+def is_expired():
+    """Condition on IdempotencyKey rows the sweeper may delete and a new claim may take over"""
+    return and_(~IdempotencyKey.permanent, IdempotencyKey.created_at < key_cutoff())
+
+def live_expenses(db, keys):
+    """Map each live key to (expense, key created_at), using one IN query"""
+    rows = db.execute(
+        select(IdempotencyKey.key, IdempotencyKey.created_at, Expense)
+        .join(Expense, Expense.id == IdempotencyKey.expense_id)
+        .where(IdempotencyKey.key.in_(keys), is_live())
+    )
+    return {key: (expense, created_at) for key, created_at, expense in rows}
+
+def claim_keys(db, expense_ids, now=None, permanent=False):
+    """
+    Claim keys for expenses inserted in the current transaction ({key: expense id}).
+
+    An expired row for a key is taken over. Returns the set of keys claimed; a key
+    that is live for another expense is left alone, and its expense should be dropped.
+    Permanent keys are never expired, swept or taken over.
+    """
+    now = now or datetime.utcnow()
+    rows = [
+        {"key": key, "expense_id": expense_id, "created_at": now, "permanent": permanent}
+        for key, expense_id in expense_ids.items()
+    ]
+    if not rows:
+        return set()
+    
+    upsert = upsert_insert(db, IdempotencyKey)
+    if upsert is not None:
+        claim = upsert.on_conflict_do_update(
+            index_elements=["key"],
+            set_={
+                "expense_id": upsert.excluded.expense_id,
+                "created_at": upsert.excluded.created_at,
+                "permanent": upsert.excluded.permanent,
+            },
+            where=is_expired(),
+        )
+        return set(db.scalars(claim.returning(IdempotencyKey.key), rows))
+    
+    # Without upserts: clear expired rows, then insert; a live duplicate raises IntegrityError
+    db.execute(delete(IdempotencyKey).where(IdempotencyKey.key.in_(expense_ids), is_expired()))
+    db.execute(insert(IdempotencyKey), rows)
+    return set(expense_ids)
+
+def sweep(db):
+    """Delete expired keys in small batches, so writers are never blocked for long; returns the count"""
+    expired_before = is_expired()
+    removed = 0
+    while True:
+        expired = select(IdempotencyKey.key).where(expired_before).limit(SWEEP_BATCH_ROWS)
+        result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.key.in_(expired)))
+        db.commit()
+        removed += result.rowcount
+        if result.rowcount < SWEEP_BATCH_ROWS:
+            return removed
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings; the false positive rate holds up to capacity keys"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.count = 0
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class IdempotencyIndex:
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE, lru_size=LRU_SIZE):
+        # A capacity of 0 disables the bloom filter: every key then takes the SELECT path
+        self.bloom = BloomFilter(capacity, error_rate) if capacity > 0 else None
+        self.error_rate = error_rate
+        self.lru_size = lru_size
+        self.seeded = False
+        self.lru_hits = 0
+        self.fast_path = 0        # keys the bloom filter proved new, so no SELECT ran
+        self.lookups = 0          # keys that needed a SELECT
+        self.false_positives = 0  # SELECTs that found nothing (including expired keys)
+        self.swept = 0
+        self.last_sweep = None
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seed(self, db):
+        """Build the bloom filter from the live keys; called at startup and after each sweep"""
+        if self.bloom is None:
+            return
+        started = time.perf_counter()
+        # Build a fresh filter so swept keys drop out. A key claimed while this runs may be
+        # missing from it; its insert then loses the claim and returns the existing expense.
+        bloom = BloomFilter(self.bloom.capacity, self.error_rate)
+        keys = db.execute(
+            select(IdempotencyKey.key)
+            .where(is_live())
+            .execution_options(yield_per=SEED_CHUNK_ROWS)
+        ).scalars()
+        for key in keys:
+            bloom.add(key)
+        with self._lock:
+            self.bloom = bloom
+            self.seeded = True
+        logger.info(f"Seeded idempotency filter with {bloom.count} keys in {time.perf_counter() - started:.2f}s")
+
+    def recent(self, key):
+        """The expense a recent request returned for this key, or None"""
+        with self._lock:
+            entry = self._recent.get(key)
+            if entry is None:
+                return None
+            response, created_at = entry
+            if created_at < key_cutoff():
+                del self._recent[key]
+                return None
+            self._recent.move_to_end(key)
+            self.lru_hits += 1
+            return response
+
+    def might_exist(self, key):
+        """False only if the key has definitely never been stored; counts the outcome"""
+        with self._lock:
+            if self.seeded and key not in self.bloom:
+                self.fast_path += 1
+                return False
+            self.lookups += 1
+            return True
+
+    def record_miss(self, count=1):
+        """Lookups the filter asked for found no existing expense"""
+        with self._lock:
+            self.false_positives += count
+
+    def remember(self, key, response, created_at):
+        """Record a live key, created at created_at, along with the expense it maps to"""
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(key)
+            if self.lru_size <= 0:
+                return
+            self._recent[key] = (response, created_at)
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.lru_size:
+                self._recent.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "seeded": self.seeded,
+                "lru_hits": self.lru_hits,
+                "fast_path": self.fast_path,
+                "lookups": self.lookups,
+                "false_positives": self.false_positives,
+                "lru_entries": len(self._recent),
+                "lru_size": self.lru_size,
+                "bloom_keys": self.bloom.count if self.bloom is not None else 0,
+                "bloom_capacity": self.bloom.capacity if self.bloom is not None else 0,
+                "ttl_hours": IDEMPOTENCY_TTL_HOURS,
+                "swept": self.swept,
+                "last_sweep": self.last_sweep,
+            }
+
+    def record_sweep(self, removed):
+        with self._lock:
+            self.swept += removed
+            self.last_sweep = datetime.utcnow().isoformat()
+
+idempotency_index = IdempotencyIndex()
+
+def sweep_expired():
+    """Delete expired keys and rebuild the bloom filter without them"""
+    db = SessionLocal()
+    try:
+        removed = sweep(db)
+        idempotency_index.record_sweep(removed)
+        if removed:
+            idempotency_index.seed(db)
+            logger.info(f"Swept {removed} expired idempotency keys")
+    finally:
+        db.close()
+
+async def run_sweeper(interval=SWEEP_INTERVAL):
+    """Background task started from lifespan; sweeps every interval seconds until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(sweep_expired)
+        except Exception:
+            logger.exception("Idempotency key sweep failed")
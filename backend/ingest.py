@@ -0,0 +1,203 @@
+"""
+Bulk expense ingestion with batch idempotency checks.
+
+Usage:
+    python ingest.py expenses.csv [--chunk-size N]
+
+CSV files need date, category, description and amount columns. An
+idempotency_key column is used when present; otherwise keys are derived
+from row content. Keys claimed by an import never expire, so re-running
+an import skips rows already loaded, however long ago that was.
+"""
+
+from collections import Counter
+from datetime import datetime
+import argparse
+import csv
+import hashlib
+import json
+import time
+
+from pydantic import ValidationError
+from sqlalchemy import delete, insert
+from sqlalchemy.exc import IntegrityError
+
+from models import IMPORT_KEY_PREFIX, Expense, SessionLocal, create_tables
+from schemas import ExpenseCreate, ExpenseResponse
+from cache import expense_cache
+from changes import next_change_seq
+from idempotency import claim_keys, idempotency_index, live_expenses
+import rollups
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_REJECTIONS = 100
+
+def resolve_keys(db, keys):
+    """Map each live idempotency key to its expense, using one IN query"""
+    found = {}
+    for key, (expense, created_at) in live_expenses(db, keys).items():
+        found[key] = ExpenseResponse.from_orm(expense)
+        idempotency_index.remember(key, found[key], created_at)
+    return found
+
+def ingest_batch(db, expenses, permanent=False):
+    """
+    Insert a list of ExpenseCreate items in a single transaction.
+
+    Returns (status, ExpenseResponse) pairs in input order, where status is
+    "created" or "duplicate". A key repeated within the batch is created once
+    and reported as a duplicate afterwards. permanent claims keys that never expire.
+    """
+    existing = {}
+    unknown = set()
+    for key in {expense.idempotency_key for expense in expenses}:
+        recent = idempotency_index.recent(key)
+        if recent is not None:
+            existing[key] = recent
+        elif idempotency_index.might_exist(key):
+            unknown.add(key)
+    # Only keys the filter cannot rule out need the IN query
+    if unknown:
+        found = resolve_keys(db, unknown)
+        idempotency_index.record_miss(len(unknown) - len(found))
+        existing.update(found)
+
+    new_rows = []
+    pending = set()
+    for expense in expenses:
+        key = expense.idempotency_key
+        if key in existing or key in pending:
+            continue
+        pending.add(key)
+        new_rows.append({
+            "idempotency_key": key,
+            "amount_cents": int(expense.amount * 100),
+            "category": expense.category,
+            "description": expense.description,
+            "date": expense.date,
+        })
+
+    try:
+        inserted = db.scalars(insert(Expense).returning(Expense), new_rows).all() if new_rows else []
+        # Keys claimed concurrently by another request are skipped instead of failing the whole batch
+        now = datetime.utcnow()
+        claimed = claim_keys(db, {row.idempotency_key: row.id for row in inserted}, now=now, permanent=permanent)
+        created_rows = [row for row in inserted if row.idempotency_key in claimed]
+        lost = [row.id for row in inserted if row.idempotency_key not in claimed]
+        if lost:
+            db.execute(delete(Expense).where(Expense.id.in_(lost)), execution_options={"synchronize_session": False})
+        rollups.apply_expenses(db, created_rows)
+        # Serialize before commit, which would expire every returned row
+        created = {row.idempotency_key: ExpenseResponse.from_orm(row) for row in created_rows}
+        # Race condition: keys that could not be claimed belong to another request's expense
+        raced = pending - created.keys()
+        if raced:
+            existing.update(resolve_keys(db, raced))
+        # Last statements before commit: the counter row stays locked only until the commit
+        if created_rows:
+            first_seq = next_change_seq(db, len(created_rows))
+            for offset, row in enumerate(created_rows):
+                row.change_seq = first_seq + offset
+        db.commit()
+        if created:
+            expense_cache.bump()
+        for key, response in created.items():
+            idempotency_index.remember(key, response, now)
+    except IntegrityError:
+        db.rollback()
+        raise
+
+    results = []
+    for expense in expenses:
+        key = expense.idempotency_key
+        if key in created:
+            results.append(("created", created.pop(key)))
+            existing[key] = results[-1][1]
+        else:
+            results.append(("duplicate", existing[key]))
+    return results
+
+def import_key(expense, occurrence):
+    """Deterministic idempotency key for an imported row and its repeat count within the file"""
+    content = [expense.date.isoformat(), expense.category, expense.description, int(expense.amount * 100), occurrence]
+    return IMPORT_KEY_PREFIX + hashlib.sha256(json.dumps(content).encode()).hexdigest()[:32]
+
+def import_csv(db, lines, chunk_size=IMPORT_CHUNK_SIZE, on_progress=None):
+    """
+    Import expenses from an iterable of CSV lines, committing every chunk_size valid rows.
+
+    Rows are parsed incrementally, so memory use is bounded by the chunk size plus one
+    16-byte digest per distinct row without an idempotency_key, which numbers its repeats.
+    Keys are claimed permanently, so importing the same file again, even after
+    IDEMPOTENCY_TTL_HOURS, only reports duplicates. on_progress, if given, is called
+    with the running report after each commit.
+    """
+    report = {"rows": 0, "created": 0, "duplicates": 0, "rejected": 0, "rejections": []}
+    occurrences = Counter()
+    chunk = []
+    started = time.perf_counter()
+
+    def flush():
+        # Import keys never expire, so a file imported again later is still recognised
+        for status, _ in ingest_batch(db, chunk, permanent=True) if chunk else []:
+            report["created" if status == "created" else "duplicates"] += 1
+        chunk.clear()
+        report["elapsed_seconds"] = time.perf_counter() - started
+        report["rows_per_sec"] = report["rows"] / report["elapsed_seconds"] if report["elapsed_seconds"] else 0.0
+        if on_progress:
+            on_progress(report)
+
+    reader = csv.DictReader(lines)
+    for row in reader:
+        report["rows"] += 1
+        try:
+            expense = ExpenseCreate(
+                idempotency_key=(row.get("idempotency_key") or "").strip() or "pending",
+                amount=row.get("amount"),
+                category=(row.get("category") or "").strip(),
+                description=(row.get("description") or "").strip(),
+                date=row.get("date"),
+            )
+        except ValidationError as e:
+            report["rejected"] += 1
+            if len(report["rejections"]) < MAX_REPORTED_REJECTIONS:
+                error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                report["rejections"].append({"line": reader.line_num, "error": error})
+            continue
+
+        if not (row.get("idempotency_key") or "").strip():
+            # A digest rather than the row itself keeps each counter entry small
+            content = json.dumps([expense.date.isoformat(), expense.category, expense.description, int(expense.amount * 100)])
+            content = hashlib.sha256(content.encode()).digest()[:16]
+            occurrences[content] += 1
+            expense.idempotency_key = import_key(expense, occurrences[content])
+
+        chunk.append(expense)
+        if len(chunk) >= chunk_size:
+            flush()
+
+    flush()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import expenses from a CSV file")
+    parser.add_argument("path")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    def print_progress(report):
+        print(
+            f"{report['rows']} rows: {report['created']} created, {report['duplicates']} duplicates, "
+            f"{report['rejected']} rejected ({report['rows_per_sec']:.0f} rows/sec)"
+        )
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        with open(args.path, newline="", encoding="utf-8-sig") as f:
+            report = import_csv(db, f, chunk_size=args.chunk_size, on_progress=print_progress)
+    finally:
+        db.close()
+
+    for rejection in report["rejections"]:
+        print(f"line {rejection['line']}: {rejection['error']}")
@@ -1,12 +1,36 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import Optional, List
+from typing import NamedTuple, Optional, List
+from datetime import date, datetime
+import base64
+import binascii
+import csv
+import asyncio
+import io
+import json
 import logging
+import os
 
-from models import Expense, get_db, create_tables
-from schemas import ExpenseCreate, ExpenseResponse
+from models import SEARCH_ENABLED, Expense, SessionLocal, USE_ASYNC_DB, create_tables, engine, get_async_db, get_db
+from schemas import (
+    EXPENSE_FIELDS, AmountPercentiles, BatchItemResult, ExpenseChanges, ExpenseCreate, ExpenseResponse,
+    ExpenseSummary, ImportReport, RollingAverage, SpendSeries, YearOverYear, encode_expense_rows,
+)
+from ingest import IMPORT_CHUNK_SIZE, import_csv, ingest_batch
+from cache import expense_cache
+from changes import changes_since, high_water, next_change_seq
+from idempotency import claim_keys, idempotency_index, live_expenses, run_sweeper
+from group_commit import GROUP_COMMIT, GroupCommitWriter
+from metrics import METRICS, MetricsMiddleware, instrument_engine, metrics, record_rows
+import analytics
+import rollups
+import search
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,7 +41,20 @@ from contextlib import asynccontextmanager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_tables()
+    db = SessionLocal()
+    try:
+        rollups.ensure_rollups(db)
+        idempotency_index.seed(db)
+    finally:
+        db.close()
+    # Expired idempotency keys are deleted in the background
+    sweeper = asyncio.create_task(run_sweeper())
+    if GROUP_COMMIT:
+        expense_writer.start()
     yield
+    if GROUP_COMMIT:
+        await expense_writer.stop()
+    sweeper.cancel()
 
 app = FastAPI(title="Expense Tracker API", lifespan=lifespan)
 
@@ -28,21 +65,152 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing"],
 )
 
+# Per-route latency histograms, query timing and a Server-Timing header
+if METRICS:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    if USE_ASYNC_DB:
+        from models import async_engine
+        instrument_engine(async_engine)
+
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 1000
+MAX_IMPORT_CHUNK_SIZE = 10000
+MAX_CHANGES_WAIT = 30  # seconds a GET /expenses/changes long-poll may wait
+CHANGES_POLL_INTERVAL = 1.0  # seconds between high-water checks for writes from other processes
+MAX_FILTER_AMOUNT = 10 ** 15  # amounts above this would overflow a 64-bit cents column once rounded
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_COLUMNS = ["id", "amount_cents", "category", "description", "date", "created_at"]
+# Stats that only ever increase; /metrics exports them as counters, the rest as gauges
+STAT_COUNTERS = {
+    "expense_cache": ("hits", "misses", "evictions", "not_modified"),
+    "idempotency": ("lru_hits", "fast_path", "lookups", "false_positives", "swept"),
+    "group_commit": ("batches", "rows"),
+}
+# Encode GET /expenses pages from plain column tuples instead of ExpenseResponse objects
+FAST_JSON = os.getenv("FAST_JSON", "").lower() in ("1", "true", "yes")
+
+def encode_cursor(sort, value, expense_id):
+    """Build an opaque cursor pointing just past the given row"""
+    # Relevance-ranked pages store their offset into the ranking instead of a sort value
+    raw = json.dumps([sort, value if sort == "rank" else value.isoformat(), expense_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor, sort):
+    """Return the (sort value, id) pair stored in a cursor for this sort order"""
+    try:
+        cursor_sort, value, expense_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if cursor_sort != sort:
+            raise ValueError("cursor was issued for a different sort order")
+        parse = {"date_desc": date.fromisoformat, "rank": int}.get(sort, datetime.fromisoformat)
+        return parse(value), int(expense_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def resolve_sort(sort, search_expression=None):
+    """Normalize the sort parameter and return it with the column it orders by"""
+    if sort == "date_desc":
+        return "date_desc", Expense.date
+    # Search results default to relevance order, which has no column of its own
+    if search_expression and sort in (None, "rank"):
+        return "rank", None
+    return "created_desc", Expense.created_at
+
+class ExpenseFilters(NamedTuple):
+    """Normalized GET /expenses filters; hashable, so equivalent queries share a cache entry"""
+    categories: tuple = ()
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    min_cents: Optional[int] = None
+    max_cents: Optional[int] = None
+    description_prefix: Optional[str] = None
+    search: Optional[str] = None  # FTS5 expression built from the q parameter
+
+def filter_params(
+    category: Optional[List[str]] = Query(None),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    min_amount: Optional[float] = Query(None, ge=0, le=MAX_FILTER_AMOUNT, allow_inf_nan=False),
+    max_amount: Optional[float] = Query(None, ge=0, le=MAX_FILTER_AMOUNT, allow_inf_nan=False),
+    description_prefix: Optional[str] = Query(None),
+    q: Optional[str] = Query(None)
+):
+    """Filter query parameters shared by the list and export endpoints"""
+    search_expression = None
+    if q:
+        if not SEARCH_ENABLED:
+            raise HTTPException(status_code=400, detail="Full-text search requires SQLite")
+        search_expression = search.match_expression(q)
+        if search_expression is None:
+            raise HTTPException(status_code=400, detail="Search query has no words to match")
+    return ExpenseFilters(
+        categories=tuple(sorted({name for name in category or [] if name})),
+        date_from=date_from,
+        date_to=date_to,
+        min_cents=round(min_amount * 100) if min_amount is not None else None,
+        max_cents=round(max_amount * 100) if max_amount is not None else None,
+        description_prefix=description_prefix or None,
+        search=search_expression,
+    )
+
+def prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with prefix, or None if there is none"""
+    prefix = prefix.rstrip(chr(0x10FFFF))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def expense_filters(filters=ExpenseFilters()):
+    """WHERE clauses shared by every filtered read of the expenses table"""
+    clauses = []
+    # Filter by category if provided
+    if len(filters.categories) == 1:
+        clauses.append(Expense.category == filters.categories[0])
+    elif filters.categories:
+        clauses.append(Expense.category.in_(filters.categories))
+    if filters.date_from is not None:
+        clauses.append(Expense.date >= filters.date_from)
+    if filters.date_to is not None:
+        clauses.append(Expense.date <= filters.date_to)
+    if filters.min_cents is not None:
+        clauses.append(Expense.amount_cents >= filters.min_cents)
+    if filters.max_cents is not None:
+        clauses.append(Expense.amount_cents <= filters.max_cents)
+    if filters.description_prefix:
+        # A range instead of LIKE, so the description index can serve it (case-sensitive)
+        clauses.append(Expense.description >= filters.description_prefix)
+        upper = prefix_upper_bound(filters.description_prefix)
+        if upper is not None:
+            clauses.append(Expense.description < upper)
+    if filters.search:
+        clauses.append(Expense.id.in_(search.matching_ids(filters.search)))
+    return clauses
+
 @app.get("/")
 def root():
     return {"message": "Expense Tracker API"}
 
-@app.post("/expenses", response_model=ExpenseResponse)
-def create_expense(expense: ExpenseCreate, db: Session = Depends(get_db)):
+def save_expense(db, expense):
     """Create expense with idempotency protection"""
     
-    # Check if expense with this idempotency key already exists
-    existing = db.query(Expense).filter(Expense.idempotency_key == expense.idempotency_key).first()
-    if existing:
-        logger.info(f"Returning existing expense for idempotency key: {expense.idempotency_key}")
-        return ExpenseResponse.from_orm(existing)
+    # Retries of a recent request are answered from memory
+    recent = idempotency_index.recent(expense.idempotency_key)
+    if recent is not None:
+        logger.info(f"Returning recent expense for idempotency key: {expense.idempotency_key}")
+        return recent
+    
+    # Check if this idempotency key is live; skipped for keys the filter knows are new
+    if idempotency_index.might_exist(expense.idempotency_key):
+        existing = live_expenses(db, [expense.idempotency_key]).get(expense.idempotency_key)
+        if existing:
+            logger.info(f"Returning existing expense for idempotency key: {expense.idempotency_key}")
+            response = ExpenseResponse.from_orm(existing[0])
+            idempotency_index.remember(expense.idempotency_key, response, existing[1])
+            return response
+        idempotency_index.record_miss()
     
     # Convert amount to cents for storage
     amount_cents = int(expense.amount * 100)
@@ -57,41 +225,452 @@ def create_expense(expense: ExpenseCreate, db: Session = Depends(get_db)):
     
     try:
         db.add(db_expense)
-        db.commit()
-        db.refresh(db_expense)
-        logger.info(f"Created new expense with id: {db_expense.id}")
-        return ExpenseResponse.from_orm(db_expense)
+        db.flush()
+        
+        # The key's row is the uniqueness check: a lost race claims nothing and rolls back the insert
+        claimed_at = db_expense.created_at
+        if claim_keys(db, {expense.idempotency_key: db_expense.id}, now=claimed_at):
+            # Keep the summary rollups in the same transaction as the insert
+            rollups.apply_expenses(db, [db_expense])
+            response = ExpenseResponse.from_orm(db_expense)
+            # Last statement before commit: the counter row stays locked only until the commit
+            db_expense.change_seq = next_change_seq(db)
+            db.commit()
+            expense_cache.bump()
+            idempotency_index.remember(expense.idempotency_key, response, claimed_at)
+            logger.info(f"Created new expense with id: {response.id}")
+            return response
     except IntegrityError:
+        pass
+    
+    db.rollback()
+    # Race condition: another request created the same idempotency key
+    existing = live_expenses(db, [expense.idempotency_key]).get(expense.idempotency_key)
+    if existing:
+        logger.info(f"Race condition handled for idempotency key: {expense.idempotency_key}")
+        response = ExpenseResponse.from_orm(existing[0])
+        idempotency_index.remember(expense.idempotency_key, response, existing[1])
+        return response
+    raise HTTPException(status_code=500, detail="Failed to create expense")
+
+def commit_group(expenses):
+    """
+    Write one group-commit batch in a single transaction; returns one ExpenseResponse per expense,
+    or the exception that failed it.
+    """
+    db = SessionLocal()
+    try:
+        try:
+            return [response for _, response in ingest_batch(db, expenses)]
+        except IntegrityError:
+            pass  # databases without upserts
+        except Exception:
+            logger.exception(f"Group commit of {len(expenses)} expenses failed, retrying them one at a time")
+        # One transaction per expense, so a bad row fails only its own request
         db.rollback()
-        # Race condition: another request created the same idempotency key
-        existing = db.query(Expense).filter(Expense.idempotency_key == expense.idempotency_key).first()
-        if existing:
-            logger.info(f"Race condition handled for idempotency key: {expense.idempotency_key}")
-            return ExpenseResponse.from_orm(existing)
-        raise HTTPException(status_code=500, detail="Failed to create expense")
+        results = []
+        for expense in expenses:
+            try:
+                results.append(save_expense(db, expense))
+            except Exception as e:
+                db.rollback()
+                results.append(e)
+        return results
+    finally:
+        db.close()
 
-@app.get("/expenses", response_model=List[ExpenseResponse])
-def get_expenses(
-    category: Optional[str] = Query(None),
-    sort: Optional[str] = Query(None),
+expense_writer = GroupCommitWriter(commit_group)
+
+if GROUP_COMMIT:
+    @app.post("/expenses", response_model=ExpenseResponse)
+    async def create_expense(expense: ExpenseCreate):
+        """Create expense through the group-commit writer, sharing a transaction with concurrent requests"""
+        return await expense_writer.submit(expense)
+elif USE_ASYNC_DB:
+    @app.post("/expenses", response_model=ExpenseResponse)
+    async def create_expense(expense: ExpenseCreate, db: AsyncSession = Depends(get_async_db)):
+        """Create expense on an async session, without holding a threadpool slot"""
+        return await db.run_sync(save_expense, expense)
+else:
+    @app.post("/expenses", response_model=ExpenseResponse)
+    def create_expense(expense: ExpenseCreate, db: Session = Depends(get_db)):
+        """Create expense with idempotency protection"""
+        return save_expense(db, expense)
+
+@app.post("/expenses/batch", response_model=List[BatchItemResult])
+def create_expenses_batch(expenses: List[ExpenseCreate], db: Session = Depends(get_db)):
+    """Create many expenses in one transaction with batch idempotency protection"""
+    
+    if len(expenses) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=422, detail=f"Batch exceeds {MAX_BATCH_SIZE} expenses")
+    if not expenses:
+        return []
+    
+    try:
+        results = ingest_batch(db, expenses)
+    except IntegrityError:
+        raise HTTPException(status_code=500, detail="Failed to create expenses")
+    
+    created = sum(1 for status, _ in results if status == "created")
+    logger.info(f"Batch created {created} expenses, {len(results) - created} duplicates")
+    return [{"status": status, "expense": expense} for status, expense in results]
+
+@app.post("/expenses/import", response_model=ImportReport)
+def import_expenses(
+    file: UploadFile = File(...),
+    chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=1, le=MAX_IMPORT_CHUNK_SIZE),
     db: Session = Depends(get_db)
 ):
-    """Get expenses with optional filtering and sorting"""
+    """Import a CSV of expenses, committing in chunks and reporting throughput"""
     
-    query = db.query(Expense)
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        report = import_csv(db, lines, chunk_size=chunk_size)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV must be UTF-8 encoded")
+    except IntegrityError:
+        raise HTTPException(status_code=500, detail="Failed to import expenses")
+    finally:
+        lines.detach()
     
-    # Filter by category if provided
-    if category:
-        query = query.filter(Expense.category == category)
+    logger.info(
+        f"Imported {report['rows']} rows: {report['created']} created, "
+        f"{report['duplicates']} duplicates, {report['rejected']} rejected "
+        f"({report['rows_per_sec']:.0f} rows/sec)"
+    )
+    return report
+
+def page_query(entities, filters=ExpenseFilters(), sort=None, cursor=None):
+    """SELECT for one page of expenses; returns (query, normalized sort, sort column or ranking offset)"""
     
-    # Sort by date if requested
-    if sort == "date_desc":
-        query = query.order_by(Expense.date.desc())
+    # Sort by date if requested; id breaks ties so every row has a stable position
+    sort, sort_column = resolve_sort(sort, filters.search)
+    
+    if sort == "rank":
+        # Join the search index for its bm25 rank; pages are offsets into the ranking
+        offset = decode_cursor(cursor, sort)[0] if cursor else 0
+        query = (
+            select(*entities)
+            .join(search.expenses_fts, search.expenses_fts.c.rowid == Expense.id)
+            .where(search.matches(filters.search), *expense_filters(filters._replace(search=None)))
+            .order_by(search.expenses_fts.c.rank, Expense.id.desc())
+            .offset(offset)
+        )
+        return query, sort, offset
+    
+    query = select(*entities).where(*expense_filters(filters))
+    
+    # Resume strictly after the last row of the previous page
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, sort)
+        query = query.where(or_(
+            sort_column < last_value,
+            and_(sort_column == last_value, Expense.id < last_id)
+        ))
+    
+    return query.order_by(sort_column.desc(), Expense.id.desc()), sort, sort_column
+
+def next_page_cursor(sort, position, page):
+    """Cursor for the page after this one; position is the sort column or the ranking offset"""
+    last = page[-1]
+    if sort == "rank":
+        return encode_cursor(sort, position + len(page), last.id)
+    return encode_cursor(sort, getattr(last, position.key), last.id)
+
+def list_expenses(db, filters=ExpenseFilters(), sort=None, limit=None, cursor=None):
+    """Get expenses with optional filtering, sorting and keyset pagination; returns (page, next cursor)"""
+    
+    query, sort, position = page_query([Expense], filters, sort, cursor)
+    
+    next_cursor = None
+    if limit is None:
+        expenses = db.scalars(query).all()
     else:
-        query = query.order_by(Expense.created_at.desc())
+        # Fetch one extra row to learn whether another page exists
+        expenses = db.scalars(query.limit(limit + 1)).all()
+        if len(expenses) > limit:
+            expenses = expenses[:limit]
+            next_cursor = next_page_cursor(sort, position, expenses)
     
-    expenses = query.all()
-    return [ExpenseResponse.from_orm(expense) for expense in expenses]
+    return [ExpenseResponse.from_orm(expense) for expense in expenses], next_cursor
+
+def list_expense_rows(db, filters=ExpenseFilters(), sort=None, limit=None, cursor=None):
+    """Same page as list_expenses, as plain column tuples in ExpenseResponse field order"""
+    
+    columns = [getattr(Expense, field) for field in EXPENSE_FIELDS]
+    query, sort, position = page_query(columns, filters, sort, cursor)
+    
+    next_cursor = None
+    if limit is None:
+        rows = db.execute(query).all()
+    else:
+        rows = db.execute(query.limit(limit + 1)).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = next_page_cursor(sort, position, rows)
+    
+    return rows, next_cursor
+
+def render_page(db, filters=ExpenseFilters(), sort=None, limit=None, cursor=None):
+    """Query a page and serialize it to JSON bytes; returns (body, next cursor)"""
+    if FAST_JSON:
+        rows, next_cursor = list_expense_rows(db, filters, sort, limit, cursor)
+        record_rows(len(rows))
+        return encode_expense_rows(rows), next_cursor
+    expenses, next_cursor = list_expenses(db, filters, sort, limit, cursor)
+    record_rows(len(expenses))
+    # Same bytes response_model would produce
+    return JSONResponse(content=jsonable_encoder(expenses)).body, next_cursor
+
+def cached_page(request, params, mark):
+    """Look up a GET /expenses page as of change feed mark; returns (response or None, cache key)"""
+    key = expense_cache.key(mark, params)
+    etag = expense_cache.etag(key)
+    
+    # Nothing was inserted since the client's copy: skip both the query and the body
+    if request.headers.get("if-none-match") == etag:
+        expense_cache.record_not_modified()
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"}), key
+    
+    entry = expense_cache.get(key)
+    if entry is None:
+        return None, key
+    return page_response(key, *entry), key
+
+def page_response(key, body, next_cursor):
+    headers = {"ETag": expense_cache.etag(key), "Cache-Control": "no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def store_page(key, body, next_cursor):
+    """Cache a freshly rendered page and respond with it"""
+    expense_cache.put(key, (body, next_cursor))
+    return page_response(key, body, next_cursor)
+
+def page_params(filters, sort, limit, cursor):
+    """Normalized GET /expenses parameters, so equivalent queries share a cache entry"""
+    return (filters, resolve_sort(sort, filters.search)[0], limit, cursor or None)
+
+if USE_ASYNC_DB:
+    @app.get("/expenses", response_model=List[ExpenseResponse])
+    async def get_expenses(
+        request: Request,
+        filters: ExpenseFilters = Depends(filter_params),
+        sort: Optional[str] = Query(None),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None),
+        db: AsyncSession = Depends(get_async_db)
+    ):
+        """Get expenses on an async session, without holding a threadpool slot"""
+        params = page_params(filters, sort, limit, cursor)
+        cached, key = cached_page(request, params, await db.run_sync(high_water))
+        if cached:
+            return cached
+        return store_page(key, *(await db.run_sync(render_page, *params)))
+else:
+    @app.get("/expenses", response_model=List[ExpenseResponse])
+    def get_expenses(
+        request: Request,
+        filters: ExpenseFilters = Depends(filter_params),
+        sort: Optional[str] = Query(None),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None),
+        db: Session = Depends(get_db)
+    ):
+        """Get expenses with optional filtering, sorting and keyset pagination"""
+        params = page_params(filters, sort, limit, cursor)
+        cached, key = cached_page(request, params, high_water(db))
+        if cached:
+            return cached
+        return store_page(key, *render_page(db, *params))
+
+@app.get("/expenses/changes", response_model=ExpenseChanges)
+async def get_expense_changes(
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    wait: float = Query(0, ge=0, le=MAX_CHANGES_WAIT)
+):
+    """
+    Expenses inserted after change sequence since, oldest first, with the new high-water mark.
+    
+    Without since, returns no expenses and the current high-water mark. With wait, a poll
+    that finds nothing holds the request open until a write lands or wait seconds pass.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        # Read the generation first, so a write committed during the query still wakes the wait
+        generation = expense_cache.generation
+        changes = await asyncio.to_thread(read_changes, since, limit)
+        remaining = deadline - loop.time()
+        if changes.expenses or since is None or remaining <= 0:
+            return changes
+        # Commits in this process wake the wait at once; those from other workers or ingest.py
+        # are found by re-reading the high-water mark every CHANGES_POLL_INTERVAL seconds
+        while remaining > 0:
+            await expense_cache.wait_for_write(generation, min(remaining, CHANGES_POLL_INTERVAL))
+            if expense_cache.generation != generation or await asyncio.to_thread(read_high_water) > since:
+                break
+            remaining = deadline - loop.time()
+
+def read_high_water():
+    db = SessionLocal()
+    try:
+        return high_water(db)
+    finally:
+        db.close()
+
+def read_changes(since, limit):
+    db = SessionLocal()
+    try:
+        if since is None:
+            return ExpenseChanges(expenses=[], since=high_water(db), has_more=False)
+        expenses, high_water_mark, has_more = changes_since(db, since, limit)
+        record_rows(len(expenses))
+        return ExpenseChanges(
+            expenses=[ExpenseResponse.from_orm(expense) for expense in expenses],
+            since=high_water_mark,
+            has_more=has_more,
+        )
+    finally:
+        db.close()
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Hit, miss and eviction counters of the GET /expenses response cache"""
+    return expense_cache.stats()
+
+@app.get("/idempotency/stats")
+def get_idempotency_stats():
+    """Fast-path, LRU hit and false positive counters of the idempotency key pre-check"""
+    return idempotency_index.stats()
+
+@app.get("/metrics")
+def get_metrics():
+    """Request, query and serialization metrics plus cache, idempotency and group commit stats, for Prometheus"""
+    body = metrics.render({
+        "expense_cache": expense_cache.stats(),
+        "idempotency": idempotency_index.stats(),
+        "group_commit": {"enabled": GROUP_COMMIT, "batches": expense_writer.batches, "rows": expense_writer.rows},
+    }, counters=STAT_COUNTERS)
+    return Response(content=body, media_type="text/plain; version=0.0.4")
+
+def iter_export_rows(filters, sort):
+    """Yield chunks of matching rows as plain tuples from a server-side cursor"""
+    _, sort_column = resolve_sort(sort)
+    query = (
+        select(*[getattr(Expense, column) for column in EXPORT_COLUMNS])
+        .where(*expense_filters(filters))
+        .order_by(sort_column.desc(), Expense.id.desc())
+        .execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    )
+    
+    # The session outlives the request handler, so the generator owns it
+    db = SessionLocal()
+    try:
+        for rows in db.execute(query).partitions():
+            record_rows(len(rows))
+            yield [
+                (id_, amount_cents, category_, description, day.isoformat(), created_at.isoformat())
+                for id_, amount_cents, category_, description, day, created_at in rows
+            ]
+    finally:
+        db.close()
+
+def stream_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_ndjson(chunks):
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows)
+
+@app.get("/expenses/export")
+def export_expenses(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    filters: ExpenseFilters = Depends(filter_params),
+    sort: Optional[str] = Query(None)
+):
+    """Stream matching expenses as CSV or NDJSON without buffering the result set"""
+    
+    chunks = iter_export_rows(filters, sort)
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(chunks),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": 'attachment; filename="expenses.ndjson"'},
+        )
+    return StreamingResponse(
+        stream_csv(chunks),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="expenses.csv"'},
+    )
+
+@app.get("/expenses/summary", response_model=ExpenseSummary)
+def get_expense_summary(
+    category: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Get expense totals per category and per month from the rollup table"""
+    
+    return rollups.summarize(db, category)
+
+def analytics_filters(filters: ExpenseFilters = Depends(filter_params), db: Session = Depends(get_db)):
+    """Bring the analytics column store up to date and return the filters a report applies"""
+    if not analytics.ANALYTICS_ENABLED:
+        raise HTTPException(status_code=503, detail="Analytics requires numpy")
+    if filters.description_prefix or filters.search:
+        raise HTTPException(status_code=400, detail="Analytics filter by category, date and amount only")
+    analytics.column_store.refresh(db)
+    return filters
+
+@app.get("/analytics/series", response_model=SpendSeries)
+def get_spend_series(
+    granularity: str = Query("month", pattern="^(day|week|month)$"),
+    filters: ExpenseFilters = Depends(analytics_filters)
+):
+    """Spend count and total per category and day, week or month"""
+    return {"granularity": granularity, "points": analytics.spend_series(filters, granularity)}
+
+@app.get("/analytics/rolling", response_model=RollingAverage)
+def get_rolling_average(
+    window: int = Query(7, ge=1, le=366),
+    filters: ExpenseFilters = Depends(analytics_filters)
+):
+    """Daily spend with its trailing window-day average"""
+    try:
+        return {"window": window, "points": analytics.rolling_average(filters, window)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/analytics/percentiles", response_model=List[AmountPercentiles])
+def get_amount_percentiles(
+    p: List[float] = Query([50, 90, 95, 99]),
+    filters: ExpenseFilters = Depends(analytics_filters)
+):
+    """Percentiles of expense amounts overall and per category"""
+    if any(not 0 <= point <= 100 for point in p):
+        raise HTTPException(status_code=400, detail="Percentiles must be between 0 and 100")
+    return analytics.amount_percentiles(filters, p)
+
+@app.get("/analytics/yoy", response_model=YearOverYear)
+def get_year_over_year(
+    year: Optional[int] = Query(None, ge=1, le=9999),
+    filters: ExpenseFilters = Depends(analytics_filters)
+):
+    """Monthly spend per category against the same month a year earlier"""
+    year, months = analytics.year_over_year(filters, year)
+    return {"year": year, "months": months}
 
 if __name__ == "__main__":
     import uvicorn
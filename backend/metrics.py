@@ -0,0 +1,198 @@
+"""
+Request timing and query instrumentation, exposed in Prometheus text format.
+
+With METRICS=1, an ASGI middleware times every request into a per-route
+latency histogram and adds a Server-Timing header, and SQLAlchemy cursor
+events count and time the queries each request runs. Queries slower than
+SLOW_QUERY_MS are logged with their SQL. Endpoints report how many rows
+they serialized with record_rows().
+
+Per-request figures live in a context variable, which Starlette copies into
+the threadpool that runs sync endpoints, so queries issued there are still
+attributed to the request that caused them.
+"""
+
+from bisect import bisect_left
+from contextvars import ContextVar
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+METRICS = os.getenv("METRICS", "").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+# Upper bounds in seconds, as in the Prometheus client defaults
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestTimer:
+    __slots__ = ("queries", "query_seconds", "rows")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+
+current_request = ContextVar("current_request", default=None)
+
+class Histogram:
+    """Cumulative latency buckets per label tuple"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, seconds):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+
+    def render(self, name, label_names):
+        lines = [f"# TYPE {name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            label_pairs = [f'{key}="{value}"' for key, value in zip(label_names, labels)]
+            label_text = "{" + ",".join(label_pairs) + "}" if label_pairs else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                bucket_labels = ",".join(label_pairs + [f'le="{bound}"'])
+                lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+            lines.append(f"{name}_sum{label_text} {series[-1]:.6f}")
+            lines.append(f"{name}_count{label_text} {cumulative}")
+        return lines
+
+class Metrics:
+    def __init__(self):
+        self.request_latency = Histogram()
+        self.query_latency = Histogram()
+        self.requests_by_status = {}  # (method, route, status) -> count
+        self.queries = {}             # (method, route) -> [queries, seconds spent in them]
+        self.rows_serialized = {}     # route -> rows
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+
+    def record_request(self, method, route, status, seconds, timer):
+        with self._lock:
+            self.request_latency.observe((method, route), seconds)
+            key = (method, route, status)
+            self.requests_by_status[key] = self.requests_by_status.get(key, 0) + 1
+            if timer.queries:
+                totals = self.queries.setdefault((method, route), [0, 0.0])
+                totals[0] += timer.queries
+                totals[1] += timer.query_seconds
+            if timer.rows:
+                self.rows_serialized[route] = self.rows_serialized.get(route, 0) + timer.rows
+
+    def record_query(self, seconds):
+        with self._lock:
+            self.query_latency.observe((), seconds)
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                self.slow_queries += 1
+
+    def render(self, stats=None, counters=None):
+        """
+        Prometheus text exposition. stats maps a metric prefix to a dict of numeric stats,
+        exported as gauges except for the names counters lists under that prefix, which
+        only ever increase and are exported as counters with a _total suffix.
+        """
+        with self._lock:
+            lines = self.request_latency.render("http_request_duration_seconds", ("method", "route"))
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route, status), count in sorted(self.requests_by_status.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+            lines += self.query_latency.render("db_query_duration_seconds", ())
+            lines.append("# TYPE db_queries_total counter")
+            for (method, route), (count, _) in sorted(self.queries.items()):
+                lines.append(f'db_queries_total{{method="{method}",route="{route}"}} {count}')
+            lines.append("# TYPE db_query_seconds_total counter")
+            for (method, route), (_, seconds) in sorted(self.queries.items()):
+                lines.append(f'db_query_seconds_total{{method="{method}",route="{route}"}} {seconds:.6f}')
+            lines.append("# TYPE db_slow_queries_total counter")
+            lines.append(f"db_slow_queries_total {self.slow_queries}")
+            lines.append("# TYPE expenses_rows_serialized_total counter")
+            for route, rows in sorted(self.rows_serialized.items()):
+                lines.append(f'expenses_rows_serialized_total{{route="{route}"}} {rows}')
+        for prefix, values in (stats or {}).items():
+            cumulative = (counters or {}).get(prefix, ())
+            for name, value in values.items():
+                # Booleans become 0/1; timestamps and other strings have no numeric value
+                if not isinstance(value, (bool, int, float)):
+                    continue
+                metric, kind = (f"{prefix}_{name}_total", "counter") if name in cumulative else (f"{prefix}_{name}", "gauge")
+                lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric} {int(value) if isinstance(value, bool) else value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def record_rows(count):
+    """Count rows serialized for the current request"""
+    timer = current_request.get()
+    if timer is not None:
+        timer.rows += count
+
+def start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def end_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    timer = current_request.get()
+    if timer is not None:
+        timer.queries += 1
+        timer.query_seconds += elapsed
+    metrics.record_query(elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {' '.join(statement.split())}")
+
+def instrument_engine(engine):
+    """Count and time every query run on engine (sync or async)"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", start_query)
+    event.listen(sync_engine, "after_cursor_execute", end_query)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency histogram and a Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def route_for(self, scope):
+        # The router records the matched endpoint in the scope; map it back to its path template
+        if self._routes is None:
+            self._routes = {route.endpoint: route.path for route in scope["app"].routes if hasattr(route, "endpoint")}
+        return self._routes.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = RequestTimer()
+        timer_token = current_request.set(timer)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                total_ms = (time.perf_counter() - started) * 1000
+                timing = (
+                    f'db;dur={timer.query_seconds * 1000:.2f};desc="{timer.queries} queries", '
+                    f"app;dur={total_ms:.2f}"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.record_request(scope["method"], self.route_for(scope), status[0], elapsed, timer)
+            current_request.reset(timer_token)
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, create_engine, UniqueConstraint
+from sqlalchemy import Boolean, Column, Integer, String, Date, DateTime, Index, create_engine, event, false, func, inspect, insert, literal, select, text, update, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from datetime import datetime, timedelta
+import os
 
 Base = declarative_base()
 
@@ -9,24 +11,277 @@ class Expense(Base):
     __tablename__ = "expenses"
     
     id = Column(Integer, primary_key=True, index=True)
-    idempotency_key = Column(String, unique=True, nullable=False, index=True)
+    # Uniqueness is enforced for live keys only, by idempotency_keys
+    idempotency_key = Column(String, nullable=False)
     amount_cents = Column(Integer, nullable=False)
     category = Column(String, nullable=False)
     description = Column(String, nullable=False)
     date = Column(Date, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Position in the change feed, from change_counter; increases in commit order
+    change_seq = Column(Integer)
 
-# SQLite database setup
-DATABASE_URL = "sqlite:///./expenses.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    # Composite indexes backing keyset pagination for each supported sort order,
+    # and the category, date range and description prefix filters of GET /expenses
+    __table_args__ = (
+        Index("ix_expenses_created_at_id", "created_at", "id"),
+        Index("ix_expenses_date_id", "date", "id"),
+        Index("ix_expenses_category_date_id", "category", "date", "id"),
+        Index("ix_expenses_category_created_at_id", "category", "created_at", "id"),
+        Index("ix_expenses_description", "description"),
+        Index("ix_expenses_change_seq", "change_seq"),
+    )
+
+class ExpenseRollup(Base):
+    """Running count and total per (category, month), updated alongside every insert"""
+    __tablename__ = "expense_rollups"
+    
+    category = Column(String, primary_key=True)
+    month = Column(String, primary_key=True)  # YYYY-MM
+    count = Column(Integer, nullable=False, default=0)
+    total_cents = Column(Integer, nullable=False, default=0)
+
+class IdempotencyKey(Base):
+    """Idempotency key of a recent create request; rows expire after IDEMPOTENCY_TTL_HOURS"""
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String, primary_key=True)
+    expense_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    # Keys claimed by CSV imports never expire, so re-running an import stays a no-op
+    permanent = Column(Boolean, nullable=False, default=False, server_default=false())
+
+class ChangeCounter(Base):
+    """Single row holding the last change_seq handed out; writers lock it until they commit"""
+    __tablename__ = "change_counter"
+    
+    id = Column(Integer, primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+
+# Database setup; SQLite by default, any SQLAlchemy URL (e.g. PostgreSQL) via DATABASE_URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./expenses.db")
+# Hosting providers often hand out the pre-SQLAlchemy 1.4 scheme
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+# Pool settings for server databases; each is also applied to SQLite when set explicitly
+POOL_SETTINGS = {
+    "pool_size": ("DB_POOL_SIZE", 10),
+    "max_overflow": ("DB_MAX_OVERFLOW", 20),
+    "pool_recycle": ("DB_POOL_RECYCLE", 1800),  # seconds
+}
+
+# Connection profiles, selected with the SQLITE_PROFILE environment variable
+SQLITE_PROFILES = {
+    # SQLite defaults: rollback journal, full fsync on every commit
+    "legacy": {
+        "pragmas": {},
+        "pool": {},
+    },
+    # Readers and the writer stop blocking each other; commits fsync only at checkpoints
+    "wal": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -64000,  # 64 MiB
+            "mmap_size": 268435456,  # 256 MiB
+            "busy_timeout": 5000,
+            "temp_store": "MEMORY",
+        },
+        # Keep warm connections for every threadpool worker that may query at once
+        "pool": {"pool_size": 20, "max_overflow": 20},
+    },
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "wal")
+
+# How long an idempotency key keeps returning the original expense
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+
+# Serve requests from async sessions instead of the threadpool (requires aiosqlite or asyncpg)
+USE_ASYNC_DB = os.getenv("DB_ASYNC", "").lower() in ("1", "true", "yes")
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def pool_options(defaults):
+    """Pool keyword arguments: the given defaults overridden by DB_POOL_* environment variables"""
+    options = dict(defaults)
+    for option, (env_var, _) in POOL_SETTINGS.items():
+        if os.getenv(env_var):
+            options[option] = int(os.getenv(env_var))
+    return options
+
+def build_engine(url=DATABASE_URL, profile=SQLITE_PROFILE, use_async=False):
+    """Create an engine; SQLite connections get the named profile applied on connect"""
+    if use_async:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        scheme, rest = url.split("://", 1)
+        url = f"{ASYNC_DRIVERS[scheme.split('+')[0]]}://{rest}"
+        factory, poolclass = create_async_engine, AsyncAdaptedQueuePool
+    else:
+        factory, poolclass = create_engine, QueuePool
+    
+    if not url.startswith("sqlite"):
+        defaults = {option: default for option, (_, default) in POOL_SETTINGS.items()}
+        # pre_ping replaces connections the server dropped while they sat in the pool
+        return factory(url, pool_pre_ping=True, **pool_options(defaults))
+    
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLITE_PROFILE {profile!r}, expected one of {sorted(SQLITE_PROFILES)}")
+    pragmas = SQLITE_PROFILES[profile]["pragmas"]
+    pool = pool_options(SQLITE_PROFILES[profile]["pool"])
+    if pool:
+        pool["poolclass"] = poolclass
+    
+    new_engine = factory(
+        url,
+        connect_args={"check_same_thread": False},
+        **pool
+    )
+    
+    # Async engines fire connection events on their underlying sync engine
+    @event.listens_for(getattr(new_engine, "sync_engine", new_engine), "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    
+    return new_engine
+
+engine = build_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+if USE_ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    async_engine = build_engine(use_async=True)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+
+# Full-text index over description and category (SQLite FTS5), kept in sync by triggers.
+# External content: the index stores only tokens and reads row text from expenses itself.
+SEARCH_TABLE = "expenses_fts"
+SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+        description, category, content='expenses', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, description, category) VALUES (new.id, new.description, new.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, description, category)
+        VALUES ('delete', old.id, old.description, old.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description, category ON expenses BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, description, category)
+        VALUES ('delete', old.id, old.description, old.category);
+        INSERT INTO {SEARCH_TABLE}(rowid, description, category) VALUES (new.id, new.description, new.category);
+    END""",
+]
+SEARCH_ENABLED = engine.dialect.name == "sqlite"
+
+def create_search_index(connection):
+    """Create the FTS5 table and its triggers, indexing existing rows the first time"""
+    created = not inspect(connection).has_table(SEARCH_TABLE)
+    # Triggers use IF NOT EXISTS, so databases from before a trigger was added still get it
+    for statement in SEARCH_DDL if created else SEARCH_DDL[1:]:
+        connection.execute(text(statement))
+    if created:
+        connection.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+
+# Prefix of the keys ingest.py derives from row content
+IMPORT_KEY_PREFIX = "import-"
+
+def copy_import_keys(connection):
+    """Keep the content-derived keys of imported expenses as permanent keys, one per key"""
+    connection.execute(
+        insert(IdempotencyKey).from_select(
+            ["key", "expense_id", "created_at", "permanent"],
+            select(Expense.idempotency_key, func.min(Expense.id), func.min(Expense.created_at), literal(True))
+            .where(
+                Expense.idempotency_key.startswith(IMPORT_KEY_PREFIX),
+                Expense.idempotency_key.not_in(select(IdempotencyKey.key)),
+            )
+            .group_by(Expense.idempotency_key),
+        )
+    )
+    connection.execute(
+        update(IdempotencyKey).where(IdempotencyKey.key.startswith(IMPORT_KEY_PREFIX)).values(permanent=True)
+    )
+
+def migrate_permanent_keys(bind):
+    """Add idempotency_keys.permanent, restoring import keys the sweeper already deleted"""
+    if "permanent" in {column["name"] for column in inspect(bind).get_columns("idempotency_keys")}:
+        return
+    with bind.begin() as connection:
+        connection.execute(text("ALTER TABLE idempotency_keys ADD COLUMN permanent BOOLEAN NOT NULL DEFAULT FALSE"))
+        copy_import_keys(connection)
+
+def migrate_idempotency_keys(bind):
+    """Move live keys out of the unique index on expenses, which grew with the whole history"""
+    legacy_index = "ix_expenses_idempotency_key"
+    if legacy_index not in {index["name"] for index in inspect(bind).get_indexes("expenses")}:
+        return
+    cutoff = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    with bind.begin() as connection:
+        connection.execute(
+            insert(IdempotencyKey).from_select(
+                ["key", "expense_id", "created_at"],
+                select(Expense.idempotency_key, Expense.id, Expense.created_at).where(
+                    Expense.created_at >= cutoff, ~Expense.idempotency_key.startswith(IMPORT_KEY_PREFIX)
+                ),
+            )
+        )
+        copy_import_keys(connection)
+        connection.execute(text(f"DROP INDEX {legacy_index}"))
+
+def migrate_change_seq(bind):
+    """Add change_seq to databases created before the change feed, numbering rows that lack one by id"""
+    if "change_seq" not in {column["name"] for column in inspect(bind).get_columns("expenses")}:
+        with bind.begin() as connection:
+            connection.execute(text("ALTER TABLE expenses ADD COLUMN change_seq INTEGER"))
+    with bind.begin() as connection:
+        counter = connection.scalar(select(ChangeCounter.seq).where(ChangeCounter.id == 1))
+        last = max(counter or 0, connection.scalar(select(func.max(Expense.change_seq))) or 0)
+        # Rows written without a sequence (older databases, bulk loads) go to the end of the feed
+        connection.execute(
+            update(Expense).where(Expense.change_seq.is_(None)).values(change_seq=Expense.id + last)
+        )
+        last = connection.scalar(select(func.max(Expense.change_seq))) or 0
+        if counter is None:
+            connection.execute(insert(ChangeCounter).values(id=1, seq=last))
+        elif counter < last:
+            connection.execute(update(ChangeCounter).where(ChangeCounter.id == 1).values(seq=last))
+
+def create_tables(bind=engine):
+    Base.metadata.create_all(bind=bind)
+    migrate_change_seq(bind)
+    # create_all skips existing tables, so add any indexes introduced since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    migrate_permanent_keys(bind)
+    migrate_idempotency_keys(bind)
+    if bind.dialect.name == "sqlite":
+        with bind.begin() as connection:
+            create_search_index(connection)
+
+def upsert_insert(db, model):
+    """INSERT for the session's database that supports ON CONFLICT clauses, or None if unsupported"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(model)
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Materialized (category, month) rollups backing GET /expenses/summary.
+
+Usage:
+    python rollups.py rebuild   # backfill rollups from the expenses table
+    python rollups.py check     # compare rollups against a full scan
+"""
+
+from collections import defaultdict
+import sys
+
+from sqlalchemy import delete, extract, func, insert, select, update
+
+from models import Expense, ExpenseRollup, SessionLocal, create_tables, upsert_insert
+
+def month_key(day):
+    return f"{day.year:04d}-{day.month:02d}"
+
+def apply_expenses(db, expenses):
+    """Add new expenses to their rollup rows inside the caller's transaction"""
+    deltas = defaultdict(lambda: [0, 0])
+    for expense in expenses:
+        delta = deltas[(expense.category, month_key(expense.date))]
+        delta[0] += 1
+        delta[1] += expense.amount_cents
+
+    upsert = upsert_insert(db, ExpenseRollup)
+    if upsert is not None:
+        if deltas:
+            db.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=["category", "month"],
+                    set_={
+                        "count": ExpenseRollup.count + upsert.excluded["count"],
+                        "total_cents": ExpenseRollup.total_cents + upsert.excluded["total_cents"],
+                    },
+                ),
+                [
+                    {"category": category, "month": month, "count": count, "total_cents": total_cents}
+                    for (category, month), (count, total_cents) in deltas.items()
+                ],
+            )
+        return
+
+    for (category, month), (count, total_cents) in deltas.items():
+        # On databases without upserts, UPDATE first and INSERT when no row exists yet
+        result = db.execute(
+            update(ExpenseRollup)
+            .where(ExpenseRollup.category == category, ExpenseRollup.month == month)
+            .values(
+                count=ExpenseRollup.count + count,
+                total_cents=ExpenseRollup.total_cents + total_cents,
+            )
+        )
+        if result.rowcount == 0:
+            db.execute(insert(ExpenseRollup).values(
+                category=category, month=month, count=count, total_cents=total_cents
+            ))
+
+def scan_rollups(db):
+    """Recompute every rollup row from a full scan of the expenses table"""
+    year = extract("year", Expense.date)
+    month = extract("month", Expense.date)
+    rows = db.execute(
+        select(Expense.category, year, month, func.count(Expense.id), func.sum(Expense.amount_cents))
+        .group_by(Expense.category, year, month)
+    )
+    return {
+        (category, f"{int(y):04d}-{int(m):02d}"): (count, total_cents)
+        for category, y, m, count, total_cents in rows
+    }
+
+def stored_rollups(db, category=None):
+    query = select(ExpenseRollup.category, ExpenseRollup.month, ExpenseRollup.count, ExpenseRollup.total_cents)
+    if category:
+        query = query.where(ExpenseRollup.category == category)
+    return {
+        (name, month): (count, total_cents)
+        for name, month, count, total_cents in db.execute(query)
+    }
+
+def rebuild(db):
+    """Replace all rollup rows with values from a full scan"""
+    rows = scan_rollups(db)
+    db.execute(delete(ExpenseRollup))
+    if rows:
+        db.execute(insert(ExpenseRollup), [
+            {"category": category, "month": month, "count": count, "total_cents": total_cents}
+            for (category, month), (count, total_cents) in rows.items()
+        ])
+    db.commit()
+    return len(rows)
+
+def check(db):
+    """Return {(category, month): (stored, scanned)} for every rollup that disagrees with a scan"""
+    stored = stored_rollups(db)
+    scanned = scan_rollups(db)
+    return {
+        key: (stored.get(key), scanned.get(key))
+        for key in stored.keys() | scanned.keys()
+        if stored.get(key) != scanned.get(key)
+    }
+
+def ensure_rollups(db):
+    """Backfill rollups for databases created before the rollup table existed"""
+    has_rollups = db.execute(select(ExpenseRollup.category).limit(1)).first()
+    has_expenses = db.execute(select(Expense.id).limit(1)).first()
+    if has_expenses and not has_rollups:
+        rebuild(db)
+
+def summarize(db, category=None):
+    """Totals per category and per month read from the rollup table"""
+    by_category = defaultdict(lambda: [0, 0])
+    by_month = defaultdict(lambda: [0, 0])
+    for (name, month), (count, total_cents) in stored_rollups(db, category).items():
+        for totals in (by_category[name], by_month[month]):
+            totals[0] += count
+            totals[1] += total_cents
+
+    return {
+        "count": sum(count for count, _ in by_category.values()),
+        "total_cents": sum(total for _, total in by_category.values()),
+        "by_category": [
+            {"category": name, "count": count, "total_cents": total}
+            for name, (count, total) in sorted(by_category.items())
+        ],
+        "by_month": [
+            {"month": month, "count": count, "total_cents": total}
+            for month, (count, total) in sorted(by_month.items())
+        ],
+    }
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command not in ("rebuild", "check"):
+        print(__doc__)
+        sys.exit(2)
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        if command == "rebuild":
+            print(f"Rebuilt {rebuild(db)} rollup rows")
+        else:
+            mismatches = check(db)
+            for (category, month), (stored, scanned) in sorted(mismatches.items()):
+                print(f"{category} {month}: rollup={stored} scan={scanned}")
+            print("Rollups consistent" if not mismatches else f"{len(mismatches)} rollup rows out of date")
+            sys.exit(1 if mismatches else 0)
+    finally:
+        db.close()
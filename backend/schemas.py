@@ -1,6 +1,12 @@
 from pydantic import BaseModel, validator, Field
 from datetime import date, datetime
-from typing import Optional
+from typing import Dict, Optional, List
+import json
+
+try:
+    import orjson
+except ImportError:  # fast path falls back to the standard library encoder
+    orjson = None
 
 class ExpenseCreate(BaseModel):
     idempotency_key: str
@@ -35,4 +41,93 @@ class ExpenseResponse(BaseModel):
             description=obj.description,
             date=obj.date,
             created_at=obj.created_at
-        )
\ No newline at end of file
+        )
+
+# Column order of ExpenseResponse, used to encode plain row tuples directly
+EXPENSE_FIELDS = list(ExpenseResponse.model_fields)
+
+def encode_expense_rows(rows):
+    """
+    Encode (id, amount_cents, category, description, date, created_at) tuples as a
+    JSON array, byte-identical to serializing the equivalent ExpenseResponse list
+    through FastAPI's JSONResponse.
+    """
+    items = [dict(zip(EXPENSE_FIELDS, row)) for row in rows]
+    if orjson is not None:
+        return orjson.dumps(items)
+    return json.dumps(
+        items, ensure_ascii=False, separators=(",", ":"), default=lambda value: value.isoformat()
+    ).encode("utf-8")
+
+class ExpenseChanges(BaseModel):
+    expenses: List[ExpenseResponse]
+    since: int  # pass back as since to get the next changes
+    has_more: bool
+
+class BatchItemResult(BaseModel):
+    status: str  # "created" or "duplicate"
+    expense: ExpenseResponse
+
+class ImportRejection(BaseModel):
+    line: int
+    error: str
+
+class ImportReport(BaseModel):
+    rows: int
+    created: int
+    duplicates: int
+    rejected: int
+    rejections: List[ImportRejection]
+    elapsed_seconds: float
+    rows_per_sec: float
+
+class CategorySummary(BaseModel):
+    category: str
+    count: int
+    total_cents: int
+
+class MonthSummary(BaseModel):
+    month: str  # YYYY-MM
+    count: int
+    total_cents: int
+
+class ExpenseSummary(BaseModel):
+    count: int
+    total_cents: int
+    by_category: List[CategorySummary]
+    by_month: List[MonthSummary]
+
+class SpendPoint(BaseModel):
+    category: str
+    period: str  # YYYY-MM-DD of the day or week start (Monday), or YYYY-MM
+    count: int
+    total_cents: int
+
+class SpendSeries(BaseModel):
+    granularity: str
+    points: List[SpendPoint]
+
+class RollingPoint(BaseModel):
+    date: date
+    total_cents: int
+    rolling_avg_cents: float
+
+class RollingAverage(BaseModel):
+    window: int
+    points: List[RollingPoint]
+
+class AmountPercentiles(BaseModel):
+    category: Optional[str]  # None for all matching expenses
+    count: int
+    percentiles: Dict[str, float]  # "p50" -> amount in cents
+
+class MonthComparison(BaseModel):
+    category: str
+    month: str  # YYYY-MM
+    total_cents: int
+    previous_total_cents: int  # same month a year earlier
+    change_pct: Optional[float]  # None when the earlier month had no spend
+
+class YearOverYear(BaseModel):
+    year: Optional[int]
+    months: List[MonthComparison]
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Full-text search over expense descriptions and categories (SQLite FTS5).
+
+Usage:
+    python search.py rebuild   # reindex every expense from the expenses table
+    python search.py check     # verify the index matches the expenses table
+"""
+
+import re
+import sys
+
+from sqlalchemy import column, select, table, text
+from sqlalchemy.exc import DatabaseError
+
+from models import SEARCH_TABLE, SessionLocal, create_tables
+
+expenses_fts = table(SEARCH_TABLE, column("rowid"), column("rank"), column(SEARCH_TABLE))
+
+def match_expression(q):
+    """
+    Turn free text into an FTS5 query: every word must match, the last one as a prefix.
+
+    Words are quoted so operators and punctuation in user input are never parsed
+    as FTS5 syntax. Returns None when q contains no searchable words.
+    """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def matches(expression):
+    """WHERE clause selecting index rows that match an expression from match_expression"""
+    return expenses_fts.c[SEARCH_TABLE].match(expression)
+
+def matching_ids(expression):
+    """Subquery of the ids of every matching expense"""
+    return select(expenses_fts.c.rowid).where(matches(expression))
+
+def rebuild(db):
+    """Discard the index and rebuild it from the expenses table"""
+    db.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+    db.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"))
+    db.commit()
+
+def check(db):
+    """Return None if the index is consistent with the expenses table, otherwise the error"""
+    try:
+        db.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) VALUES ('integrity-check', 1)"))
+    except DatabaseError as e:
+        db.rollback()
+        return str(e.orig)
+    return None
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command not in ("rebuild", "check"):
+        print(__doc__)
+        sys.exit(2)
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        if command == "rebuild":
+            rebuild(db)
+            print("Rebuilt search index")
+        else:
+            error = check(db)
+            print("Search index consistent" if error is None else f"Search index out of date: {error}")
+            sys.exit(1 if error else 0)
+    finally:
+        db.close()
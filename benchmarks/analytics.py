@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Latency of the /analytics reports over a large expense history.
+
+Loads the cached synthetic dataset (see load.py) into the analytics column
+store once, timing the load, then times each report over the whole history,
+for one category and for a one-year date range. Requires numpy.
+
+Usage:
+    python benchmarks/analytics.py [--rows 2000000] [--runs 20]
+"""
+
+import argparse
+import time
+from datetime import date
+
+from common import percentiles, use_backend, write_results
+from load import DATA_DIR, dataset
+
+def run(source, runs):
+    use_backend()
+    from sqlalchemy.orm import Session
+
+    import analytics
+    from main import ExpenseFilters
+    from models import build_engine, create_tables
+
+    engine = build_engine(f"sqlite:///{source}")
+    # Numbers the change feed of datasets built before it existed, once
+    create_tables(bind=engine)
+    with Session(engine) as db:
+        started = time.perf_counter()
+        loaded = analytics.column_store.refresh(db)
+        load_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        analytics.column_store.refresh(db)
+        refresh_seconds = time.perf_counter() - started
+
+    filter_cases = {
+        "all": ExpenseFilters(),
+        "category": ExpenseFilters(categories=("Food",)),
+        "one_year": ExpenseFilters(date_from=date(2020, 1, 1), date_to=date(2020, 12, 31)),
+    }
+    reports = {
+        "series_day": lambda filters: analytics.spend_series(filters, "day"),
+        "series_week": lambda filters: analytics.spend_series(filters, "week"),
+        "series_month": lambda filters: analytics.spend_series(filters, "month"),
+        "rolling_30": lambda filters: analytics.rolling_average(filters, 30),
+        "percentiles": lambda filters: analytics.amount_percentiles(filters, [50, 90, 95, 99]),
+        "yoy": lambda filters: analytics.year_over_year(filters, 2020),
+    }
+    results = {
+        "rows": loaded,
+        "load_seconds": round(load_seconds, 2),
+        "refresh_ms": round(refresh_seconds * 1000, 3),
+    }
+    for report, compute in reports.items():
+        for case, filters in filter_cases.items():
+            samples = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                compute(filters)
+                samples.append(time.perf_counter() - started)
+            results[f"{report}:{case}"] = percentiles(samples)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where generated datasets are cached")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    # Reports only read, so the cached dataset is used in place
+    results = run(dataset("backend", args.rows, args.data_dir), args.runs)
+    print(
+        f"Loaded {results['rows']} rows in {results['load_seconds']}s; "
+        f"refresh with nothing new took {results['refresh_ms']}ms"
+    )
+    for case, stats in results.items():
+        if isinstance(stats, dict):
+            print(f"{case:>24}  p50={stats['p50']}ms p95={stats['p95']}ms p99={stats['p99']}ms")
+
+    if args.output:
+        write_results(args.output, "analytics", results)
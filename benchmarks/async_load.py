@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Sync (threadpool) versus async (DB_ASYNC=1) request paths under load.
+
+Starts the backend once per mode against the same seeded database and
+runs a mixed GET/POST /expenses workload at each concurrency level,
+reporting requests/sec and latency percentiles.
+
+Usage:
+    python benchmarks/async_load.py [--concurrency 16 64 128] [--seconds 5] [--write-ratio 0.1]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+from common import backend_server, percentiles, write_results
+
+def seed(port, rows):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    for start in range(0, rows, 1000):
+        batch = [
+            {
+                "idempotency_key": f"seed-{i}",
+                "amount": 1 + i % 500,
+                "category": ["Food", "Travel", "Rent", "Fun"][i % 4],
+                "description": f"Seed expense {i}",
+                "date": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            }
+            for i in range(start, min(rows, start + 1000))
+        ]
+        conn.request("POST", "/expenses/batch", json.dumps(batch), {"Content-Type": "application/json"})
+        conn.getresponse().read()
+
+def run_load(port, concurrency, seconds, write_ratio):
+    stop = threading.Event()
+    latencies = {"GET": [], "POST": []}
+    failures = [0]
+    lock = threading.Lock()
+    run_id = uuid.uuid4().hex[:8]
+
+    def client(n):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        rng = random.Random(n)
+        samples = {"GET": [], "POST": []}
+        failed, i = 0, 0
+        while not stop.is_set():
+            i += 1
+            if rng.random() < write_ratio:
+                method, path = "POST", "/expenses"
+                body = json.dumps({
+                    "idempotency_key": f"load-{run_id}-{n}-{i}",
+                    "amount": 9.99,
+                    "category": "Load",
+                    "description": "Async load test",
+                    "date": "2024-06-01",
+                })
+            else:
+                method, path, body = "GET", "/expenses?limit=50&category=Food", None
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                if response.status == 200:
+                    samples[method].append(time.perf_counter() - started)
+                else:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        with lock:
+            for method in samples:
+                latencies[method].extend(samples[method])
+            failures[0] += failed
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    everything = latencies["GET"] + latencies["POST"]
+    return {
+        "requests_per_sec": round(len(everything) / seconds, 1),
+        "errors": failures[0],
+        **percentiles(everything),
+        "by_method": {method: percentiles(samples) for method, samples in latencies.items()},
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 128])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--seed-rows", type=int, default=10000)
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        results = {}
+        for mode in ("sync", "async"):
+            env = dict(os.environ, DATABASE_URL=database_url, DB_ASYNC="1" if mode == "async" else "0")
+            with backend_server(env) as port:
+                if mode == "sync":
+                    seed(port, args.seed_rows)
+                for concurrency in args.concurrency:
+                    stats = run_load(port, concurrency, args.seconds, args.write_ratio)
+                    results[f"{mode}_c{concurrency}"] = stats
+                    print(
+                        f"{mode:>5} c={concurrency:<4} {stats['requests_per_sec']:>8.1f} req/s  "
+                        f"p50={stats['p50']}ms p99={stats['p99']}ms errors={stats['errors']}"
+                    )
+
+    if args.output:
+        write_results(args.output, "async_load", results)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Cold start of the serverless handlers in api/.
+
+Starts a fresh interpreter per sample, as a new function instance would, and
+measures for each handler:
+    imports   total of `python -X importtime` for everything the process imports
+    import    time to import the handler module itself
+    first     first request, including loading storage from the log
+    warm      a second request in the same process
+    process   interpreter start to exit, as seen from outside
+
+Each handler is measured against a copy of a --rows record log, with the read
+index sidecar present (an instance reusing /tmp) and without it (a fresh
+/tmp). Exits non-zero if --budget-ms is given and the median import plus
+first request of any case exceeds it.
+
+Usage:
+    python benchmarks/cold_start.py [--rows 100000] [--runs 5] [--budget-ms 250]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import API_DIR, write_results
+from load import DATA_DIR, dataset
+
+# Requests a new instance typically answers first
+REQUESTS = {
+    "expenses": (
+        "POST", "/api/expenses",
+        '{"idempotency_key": "cold-%d", "amount": 12.5, "category": "Food", '
+        '"description": "cold start", "date": "2024-01-15"}',
+    ),
+    "list": ("GET", "/api/list?limit=50", ""),
+}
+
+# Runs in the fresh interpreter; drives the handler class over an in-memory connection
+CHILD = """
+import io, json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {api_dir!r})
+import {handler} as module
+imported = time.perf_counter()
+
+class Connection:
+    def __init__(self, raw):
+        self.raw, self.sent = raw, bytearray()
+    def makefile(self, mode, bufsize=-1):
+        return io.BytesIO(self.raw)
+    def sendall(self, data):
+        self.sent += data
+
+def request(n):
+    method, path, body = {request!r}
+    body = (body % n if "%d" in body else body).encode()
+    raw = f"{{method}} {{path}} HTTP/1.1\\r\\nHost: bench\\r\\nContent-Type: application/json\\r\\nContent-Length: {{len(body)}}\\r\\n\\r\\n".encode() + body
+    connection = Connection(raw)
+    module.handler.log_message = lambda *args: None
+    module.handler(connection, ("127.0.0.1", 0), None)
+    status = int(connection.sent.split(b" ", 2)[1])
+    if status != 200:
+        raise SystemExit(f"{handler} answered {{status}}")
+
+request({run} * 2)
+first = time.perf_counter()
+request({run} * 2 + 1)
+warm = time.perf_counter()
+print(json.dumps({{"import": imported - started, "first": first - imported, "warm": warm - first}}))
+"""
+
+def import_total(stderr):
+    """Sum of the cumulative times of top-level imports in -X importtime output, in seconds"""
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # nested imports are already counted by their parent
+            total += int(cumulative)
+    return total / 1e6
+
+def sample(handler, log_file, run):
+    code = CHILD.format(api_dir=os.path.abspath(API_DIR), handler=handler, request=REQUESTS[handler], run=run)
+    started = time.perf_counter()
+    child = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=dict(os.environ, EXPENSES_LOG_FILE=log_file), capture_output=True, text=True,
+    )
+    process = time.perf_counter() - started
+    if child.returncode:
+        raise RuntimeError(f"{handler} failed:\n{child.stderr[-2000:]}")
+    timings = json.loads(child.stdout)
+    return {"imports": import_total(child.stderr), "process": process, **timings}
+
+def build_index(log_file):
+    """Write the read index sidecar for a log, as an earlier invocation would have"""
+    subprocess.run(
+        [sys.executable, "-c", f"import sys; sys.path.insert(0, {os.path.abspath(API_DIR)!r}); "
+                               "import storage; storage.get_expenses(limit=1)"],
+        env=dict(os.environ, EXPENSES_LOG_FILE=log_file), check=True,
+    )
+
+def measure(handler, source, with_index, runs, tmp):
+    samples = []
+    for run in range(runs):
+        # A fresh copy per sample, so the log is as the cold instance would find it
+        log_file = os.path.join(tmp, f"{handler}-{'index' if with_index else 'no-index'}-{run}.ndjson")
+        shutil.copyfile(source, log_file)
+        if with_index:
+            # The sidecar is tied to the log's inode, so it is built for each copy
+            build_index(log_file)
+        samples.append(sample(handler, log_file, run))
+    return {
+        f"{name}_ms": round(statistics.median(s[name] for s in samples) * 1000, 2)
+        for name in ("imports", "import", "first", "warm", "process")
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--handlers", nargs="+", choices=list(REQUESTS), default=list(REQUESTS))
+    parser.add_argument("--budget-ms", type=float, help="fail if import plus first request exceeds this")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where generated datasets are cached")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    source = dataset("storage", args.rows, args.data_dir)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for handler in args.handlers:
+            for with_index in (True, False):
+                case = f"{handler}_{'index' if with_index else 'no_index'}"
+                results[case] = stats = measure(handler, source, with_index, args.runs, tmp)
+                print(
+                    f"{case:>18}  imports={stats['imports_ms']}ms import={stats['import_ms']}ms "
+                    f"first={stats['first_ms']}ms warm={stats['warm_ms']}ms process={stats['process_ms']}ms"
+                )
+
+    if args.output:
+        write_results(args.output, "cold_start", {"rows": args.rows, **results})
+    if args.budget_ms is not None:
+        over_budget = [
+            case for case, stats in results.items() if stats["import_ms"] + stats["first_ms"] > args.budget_ms
+        ]
+        if over_budget:
+            print(f"❌ Cold start over {args.budget_ms}ms: {', '.join(over_budget)}")
+            sys.exit(1)
+        print(f"✅ Cold starts within {args.budget_ms}ms")
@@ -0,0 +1,117 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+
+from contextlib import contextmanager
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api")
+
+CATEGORIES = ["Food", "Travel", "Rent", "Utilities", "Fun", "Health", "Shopping", "Other"]
+DESCRIPTION_WORDS = ["coffee", "groceries", "taxi", "train", "lunch", "dinner", "rent", "power",
+                     "water", "cinema", "concert", "pharmacy", "shoes", "books", "gift", "fuel"]
+
+def use_backend():
+    """Make backend modules (models, main, ...) importable from a benchmark script"""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+def use_api():
+    """Make the serverless modules (storage, ...) importable from a benchmark script"""
+    if API_DIR not in sys.path:
+        sys.path.insert(0, os.path.abspath(API_DIR))
+
+def synthetic_expenses(rows, seed=1):
+    """
+    Yield a reproducible stream of expense rows spread over ten years of dates.
+
+    Rows arrive roughly in date order, as expenses are usually entered close
+    to the day they happened.
+    """
+    rng = random.Random(seed)
+    start = date(2015, 1, 1)
+    created = datetime(2020, 1, 1)
+    for i in range(rows):
+        yield {
+            "id": i + 1,
+            "idempotency_key": f"seed-{seed}-{i}",
+            "amount_cents": rng.randint(100, 100000),
+            "category": rng.choice(CATEGORIES),
+            "description": f"{rng.choice(DESCRIPTION_WORDS)} {rng.choice(DESCRIPTION_WORDS)} {i}",
+            "date": start + timedelta(days=i * 3650 // rows + rng.randrange(7)),
+            "created_at": created + timedelta(seconds=i * 7, microseconds=rng.randrange(1000000)),
+        }
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+@contextmanager
+def backend_server(env=None, workers=1):
+    """Run the backend under uvicorn in a subprocess and yield its port"""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        wait_until_ready(port)
+        yield port
+    finally:
+        server.terminate()
+        server.wait()
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Nearest-rank percentiles of a list of latencies, in milliseconds"""
+    if not samples:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(samples)
+    return {
+        f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 3)
+        for p in points
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(path, name, results):
+    """Write results as JSON with enough context to compare runs across commits"""
+    payload = {
+        "benchmark": name,
+        "revision": git_revision(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Results written to {path}")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+POST /expenses throughput and latency with and without group commit.
+
+Starts the backend once per (SQLite profile, mode) against a fresh
+database and runs concurrent create requests at each concurrency level.
+The legacy profile syncs to disk on every commit; under WAL, batching
+mostly saves the contention of threadpool workers queueing on the write
+lock. At concurrency 1 the window only adds latency.
+
+Usage:
+    python benchmarks/group_commit.py [--concurrency 1 16 64] [--seconds 5] [--window-ms 2]
+"""
+
+import argparse
+import os
+import tempfile
+
+from common import write_results
+from concurrent_writes import run_workers
+
+MODES = ("per_request", "group_commit")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--window-ms", type=float, default=2)
+    parser.add_argument("--max-rows", type=int, default=256)
+    parser.add_argument("--profiles", nargs="+", default=["legacy", "wal"])
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for profile in args.profiles:
+        for mode in MODES:
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(
+                    os.environ,
+                    DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                    SQLITE_PROFILE=profile,
+                    GROUP_COMMIT="1" if mode == "group_commit" else "0",
+                    GROUP_COMMIT_WINDOW_MS=str(args.window_ms),
+                    GROUP_COMMIT_MAX_ROWS=str(args.max_rows),
+                )
+                for concurrency in args.concurrency:
+                    stats = run_workers(1, concurrency, args.seconds, env)
+                    results[f"{profile}_{mode}_c{concurrency}"] = stats
+                    print(
+                        f"{profile:>6} {mode:>12} c={concurrency:<4} {stats['writes_per_sec']:>8.1f} writes/s  "
+                        f"p50={stats['p50']}ms p95={stats['p95']}ms p99={stats['p99']}ms errors={stats['errors']}"
+                    )
+
+    if args.output:
+        write_results(args.output, "group_commit", {"window_ms": args.window_ms, "max_rows": args.max_rows, **results})
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Create, list and filter throughput against the backend or the serverless storage.
+
+Builds a synthetic dataset of --rows expenses once (cached under --data-dir),
+copies it to a scratch directory for each run and drives each scenario at
+each concurrency level for --seconds, reporting requests/sec and p50/p95/p99.
+
+Targets:
+    backend  backend/main.py, in process through an ASGI client (--transport asgi)
+             or under uvicorn over HTTP (--transport uvicorn)
+    storage  api/storage.py called directly, one process per concurrent client,
+             since its index is per process and not thread-safe
+
+The backend runs with the response cache disabled unless --response-cache is
+given, so reads measure the database rather than the cache.
+
+Usage:
+    python benchmarks/load.py --target backend [--transport asgi] [--rows 100000] \\
+        [--scenarios create list filter] [--concurrency 1 16 64] [--seconds 5] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+from common import (
+    CATEGORIES, backend_server, percentiles, synthetic_expenses, use_api, use_backend, write_results,
+)
+
+SCENARIOS = ("create", "list", "filter")
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SEED_CHUNK = 50000
+PAGE_SIZE = 50
+
+def random_filter(rng):
+    """A category, a quarter of dates and a minimum amount, as typed query parameters"""
+    date_from = date(2015, 1, 1) + timedelta(days=rng.randrange(3650 - 90))
+    return {
+        "category": rng.choice(CATEGORIES),
+        "date_from": date_from.isoformat(),
+        "date_to": (date_from + timedelta(days=90)).isoformat(),
+        "min_amount": 10,
+    }
+
+def new_expense(run_id, n, i):
+    return {
+        "idempotency_key": f"load-{run_id}-{n}-{i}",
+        "amount": 12.34,
+        "category": "Food",
+        "description": "Load test expense",
+        "date": "2024-06-01",
+    }
+
+def http_request(scenario, rng, run_id, n, i):
+    """(method, path, body) for one request of a scenario"""
+    if scenario == "create":
+        return "POST", "/expenses", json.dumps(new_expense(run_id, n, i))
+    if scenario == "list":
+        return "GET", f"/expenses?limit={PAGE_SIZE}", None
+    query = "&".join(f"{name}={value}" for name, value in random_filter(rng).items())
+    return "GET", f"/expenses?sort=date_desc&limit={PAGE_SIZE}&{query}", None
+
+def summarize(samples, errors, seconds):
+    return {
+        "requests": len(samples),
+        "requests_per_sec": round(len(samples) / seconds, 1),
+        "errors": errors,
+        **percentiles(samples),
+    }
+
+# Datasets
+
+def build_backend_dataset(path, rows):
+    use_backend()
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+
+    import rollups
+    from models import Expense, build_engine, create_tables, migrate_change_seq
+
+    engine = build_engine(f"sqlite:///{path}")
+    create_tables(bind=engine)
+    expenses = synthetic_expenses(rows)
+    while True:
+        chunk = [row for _, row in zip(range(SEED_CHUNK), expenses)]
+        if not chunk:
+            break
+        with engine.begin() as conn:
+            conn.execute(insert(Expense), chunk)
+    # Give the bulk-loaded rows their change feed numbers now rather than on every run
+    migrate_change_seq(engine)
+    with Session(engine) as db:
+        rollups.rebuild(db)
+    engine.dispose()
+
+def build_storage_dataset(path, rows):
+    with open(path, "w") as f:
+        for row in synthetic_expenses(rows):
+            row.update(date=row["date"].isoformat(), created_at=row["created_at"].isoformat())
+            f.write(json.dumps(row) + "\n")
+
+def dataset(target, rows, data_dir):
+    """Path of the cached dataset for a target, building it on first use"""
+    os.makedirs(data_dir, exist_ok=True)
+    suffix = "db" if target == "backend" else "ndjson"
+    path = os.path.join(data_dir, f"{target}-{rows}.{suffix}")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        building = f"{path}.{os.getpid()}"
+        if target == "backend":
+            # Importing models binds the backend's engine to DATABASE_URL, so do it in a child
+            # process; the caller may import the backend later, pointed at its working copy
+            builder = multiprocessing.get_context("spawn").Process(target=build_backend_dataset, args=(building, rows))
+            builder.start()
+            builder.join()
+            if builder.exitcode:
+                raise RuntimeError(f"building the backend dataset failed with exit code {builder.exitcode}")
+        else:
+            build_storage_dataset(building, rows)
+        os.replace(building, path)
+        print(f"Built {target} dataset of {rows} rows in {time.perf_counter() - started:.1f}s")
+    return path
+
+# Backend over uvicorn
+
+def run_uvicorn(port, scenario, concurrency, seconds):
+    stop = threading.Event()
+    latencies, failures = [], [0]
+    lock = threading.Lock()
+    run_id = uuid.uuid4().hex[:8]
+
+    def client(n):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        rng = random.Random(n)
+        samples, failed, i = [], 0, 0
+        while not stop.is_set():
+            i += 1
+            method, path, body = http_request(scenario, rng, run_id, n, i)
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                if response.status == 200:
+                    samples.append(time.perf_counter() - started)
+                else:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        with lock:
+            latencies.extend(samples)
+            failures[0] += failed
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, failures[0], seconds)
+
+# Backend in process over ASGI
+
+async def run_asgi(app, scenario, concurrency, seconds):
+    import httpx
+
+    # One INFO line per request would dominate the measurement
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    latencies, failures = [], [0]
+    run_id = uuid.uuid4().hex[:8]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+
+    async def client(http, n):
+        rng = random.Random(n)
+        i = 0
+        while loop.time() < deadline:
+            i += 1
+            method, path, body = http_request(scenario, rng, run_id, n, i)
+            started = time.perf_counter()
+            response = await http.request(method, path, content=body, headers={"Content-Type": "application/json"})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures[0] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        await asyncio.gather(*(client(http, n) for n in range(concurrency)))
+    return summarize(latencies, failures[0], seconds)
+
+async def run_asgi_scenarios(scenarios, concurrency_levels, seconds):
+    use_backend()
+    import main
+
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        for scenario in scenarios:
+            for concurrency in concurrency_levels:
+                results[f"{scenario}_c{concurrency}"] = await run_asgi(main.app, scenario, concurrency, seconds)
+                report(scenario, concurrency, results[f"{scenario}_c{concurrency}"])
+    return results
+
+# Serverless storage
+
+def storage_client(log_file, scenario, n, seconds, barrier, queue):
+    os.environ["EXPENSES_LOG_FILE"] = log_file
+    use_api()
+    import storage
+
+    # Load the read index and the key map before the clock starts
+    storage.get_expenses(limit=1)
+    storage.add_expense({"idempotency_key": "seed-1-0"})
+    rng = random.Random(n)
+    run_id = uuid.uuid4().hex[:8]
+    samples, failed, i = [], 0, 0
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        i += 1
+        started = time.perf_counter()
+        try:
+            if scenario == "create":
+                storage.add_expense(new_expense(run_id, n, i))
+            elif scenario == "list":
+                storage.get_expenses(limit=PAGE_SIZE)
+            else:
+                params = random_filter(rng)
+                storage.get_expenses(
+                    [params["category"]], "date_desc", PAGE_SIZE, date_from=params["date_from"],
+                    date_to=params["date_to"], min_cents=params["min_amount"] * 100,
+                )
+            samples.append(time.perf_counter() - started)
+        except Exception:
+            failed += 1
+    queue.put((samples, failed))
+
+def run_storage(log_file, scenario, concurrency, seconds):
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(concurrency)
+    queue = context.Queue()
+    clients = [
+        context.Process(target=storage_client, args=(log_file, scenario, n, seconds, barrier, queue))
+        for n in range(concurrency)
+    ]
+    for client in clients:
+        client.start()
+    latencies, failures = [], 0
+    for _ in clients:
+        samples, failed = queue.get()
+        latencies.extend(samples)
+        failures += failed
+    for client in clients:
+        client.join()
+    return summarize(latencies, failures, seconds)
+
+def build_storage_index(log_file):
+    """Index the copied log once, so clients load the sidecar instead of each rebuilding it"""
+    def build():
+        os.environ["EXPENSES_LOG_FILE"] = log_file
+        use_api()
+        import storage
+        storage.get_expenses(limit=1)
+
+    started = time.perf_counter()
+    process = multiprocessing.get_context("fork").Process(target=build)
+    process.start()
+    process.join()
+    return round(time.perf_counter() - started, 2)
+
+def report(scenario, concurrency, stats):
+    print(
+        f"{scenario:>7} c={concurrency:<4} {stats['requests_per_sec']:>9.1f} req/s  "
+        f"p50={stats['p50']}ms p95={stats['p95']}ms p99={stats['p99']}ms errors={stats['errors']}"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["backend", "storage"], default="backend")
+    parser.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--response-cache", action="store_true", help="keep the backend's response cache enabled")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where generated datasets are cached")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    source = dataset(args.target, args.rows, args.data_dir)
+    config = {"target": args.target, "rows": args.rows, "seconds": args.seconds}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Work on a copy, so created expenses never leak into the next run's dataset
+        working = os.path.join(tmp, os.path.basename(source))
+        shutil.copyfile(source, working)
+
+        if args.target == "storage":
+            config["index_build_seconds"] = build_storage_index(working)
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    results[f"{scenario}_c{concurrency}"] = run_storage(working, scenario, concurrency, args.seconds)
+                    report(scenario, concurrency, results[f"{scenario}_c{concurrency}"])
+        else:
+            config.update(transport=args.transport, response_cache=args.response_cache)
+            env = {"DATABASE_URL": f"sqlite:///{working}"}
+            if not args.response_cache:
+                env["RESPONSE_CACHE_SIZE"] = "0"
+            if args.transport == "asgi":
+                # The backend reads its configuration at import time
+                assert "models" not in sys.modules, "backend imported before DATABASE_URL was set"
+                os.environ.update(env)
+                results = asyncio.run(run_asgi_scenarios(args.scenarios, args.concurrency, args.seconds))
+            else:
+                with backend_server(dict(os.environ, **env)) as port:
+                    for scenario in args.scenarios:
+                        for concurrency in args.concurrency:
+                            results[f"{scenario}_c{concurrency}"] = run_uvicorn(port, scenario, concurrency, args.seconds)
+                            report(scenario, concurrency, results[f"{scenario}_c{concurrency}"])
+
+    if args.output:
+        write_results(args.output, "load", {**config, **results})
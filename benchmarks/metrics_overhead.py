@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Cost of the METRICS=1 instrumentation per request.
+
+Loads the backend once and calls it directly over ASGI (no HTTP client in the
+way), alternating blocks of requests with the metrics middleware and query
+hooks installed and removed, so drift in machine load hits both sides alike.
+Compares the median per-request time of each scenario and exits non-zero if
+instrumentation adds more than --budget percent (default 5).
+
+Usage:
+    python benchmarks/metrics_overhead.py [--rows 100000] [--scenarios list filter create] \\
+        [--blocks 20] [--block-size 100] [--budget 5]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+from common import use_backend, write_results
+from load import DATA_DIR, dataset, http_request
+
+async def call(app, method, path, body):
+    """Run one request through the ASGI app and return its status"""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    messages = [{"type": "http.request", "body": (body or "").encode(), "more_body": False}]
+    status = []
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+async def measure(app, scenario, block_size, rng, run_id, block):
+    started = time.perf_counter()
+    for i in range(block_size):
+        status = await call(app, *http_request(scenario, rng, run_id, block, i))
+        if status != 200:
+            raise RuntimeError(f"{scenario} request failed with {status}")
+    return (time.perf_counter() - started) / block_size
+
+async def run(scenarios, blocks, block_size):
+    from sqlalchemy import event
+
+    import main
+    import metrics
+    from models import engine
+
+    instrumented = metrics.MetricsMiddleware(main.app)
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        for scenario in scenarios:
+            rng, run_id = random.Random(1), uuid.uuid4().hex[:8]
+            samples = {"off": [], "on": []}
+            await measure(main.app, scenario, block_size, rng, run_id, -1)  # warm up
+            for block in range(blocks):
+                samples["off"].append(await measure(main.app, scenario, block_size, rng, run_id, 2 * block))
+                metrics.instrument_engine(engine)
+                samples["on"].append(await measure(instrumented, scenario, block_size, rng, run_id, 2 * block + 1))
+                event.remove(engine, "before_cursor_execute", metrics.start_query)
+                event.remove(engine, "after_cursor_execute", metrics.end_query)
+            off, on = statistics.median(samples["off"]), statistics.median(samples["on"])
+            results[scenario] = {
+                "off_us": round(off * 1e6, 1),
+                "on_us": round(on * 1e6, 1),
+                "overhead_us": round((on - off) * 1e6, 1),
+                "overhead_pct": round((on - off) / off * 100, 2),
+            }
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--scenarios", nargs="+", default=["list", "filter", "create"])
+    parser.add_argument("--blocks", type=int, default=20)
+    parser.add_argument("--block-size", type=int, default=100)
+    parser.add_argument("--budget", type=float, default=5, help="allowed overhead, percent of request time")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where generated datasets are cached")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    source = dataset("backend", args.rows, args.data_dir)
+    with tempfile.TemporaryDirectory() as tmp:
+        working = os.path.join(tmp, os.path.basename(source))
+        shutil.copyfile(source, working)
+        # Import the backend uninstrumented; the benchmark installs the instrumentation itself.
+        # dataset() builds in a child process, so nothing has bound the engine to another database yet
+        assert "models" not in sys.modules, "backend imported before DATABASE_URL was set"
+        os.environ.update(DATABASE_URL=f"sqlite:///{working}", RESPONSE_CACHE_SIZE="0", METRICS="0")
+        use_backend()
+        results = asyncio.run(run(args.scenarios, args.blocks, args.block_size))
+
+    over_budget = []
+    for scenario, stats in results.items():
+        print(
+            f"{scenario:>7} {stats['off_us']:>9.1f}us -> {stats['on_us']:>9.1f}us per request  "
+            f"overhead {stats['overhead_us']:+.1f}us ({stats['overhead_pct']:+.2f}%)"
+        )
+        if stats["overhead_pct"] > args.budget:
+            over_budget.append(scenario)
+
+    if args.output:
+        write_results(args.output, "metrics_overhead", {"rows": args.rows, "budget_pct": args.budget, **results})
+    if over_budget:
+        print(f"❌ Over the {args.budget}% budget: {', '.join(over_budget)}")
+        sys.exit(1)
+    print(f"✅ Instrumentation overhead within {args.budget}%")
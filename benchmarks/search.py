@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Latency of GET /expenses?q= full-text queries against a large SQLite database.
+
+Seeds a scratch database with synthetic descriptions drawn from a vocabulary
+with a skewed word frequency, then times one page of results for rare,
+common and prefix terms in relevance and date order.
+
+Usage:
+    python benchmarks/search.py [--rows 1000000] [--queries 50]
+"""
+
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from common import percentiles, use_backend, write_results
+
+use_backend()
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+import main
+import search
+from models import Expense, build_engine, create_tables
+
+CATEGORIES = ["Food", "Travel", "Rent", "Utilities", "Fun"]
+SEED_CHUNK = 50000
+
+def vocabulary(size):
+    rng = random.Random(7)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)]
+
+def seed(engine, rows, words):
+    rng = random.Random(42)
+    # Zipf-like weights: a few words appear everywhere, most are rare
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    start = date(2015, 1, 1)
+    for chunk_start in range(0, rows, SEED_CHUNK):
+        chunk = range(chunk_start, min(rows, chunk_start + SEED_CHUNK))
+        with engine.begin() as conn:
+            conn.execute(insert(Expense), [
+                {
+                    "idempotency_key": f"seed-{i}",
+                    "amount_cents": rng.randint(100, 50000),
+                    "category": CATEGORIES[i % len(CATEGORIES)],
+                    "description": " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(2, 5))),
+                    "date": start + timedelta(days=i % 3650),
+                }
+                for i in chunk
+            ])
+
+def run(rows, queries, limit):
+    words = vocabulary(5000)
+    cases = {
+        "common": words[0],
+        "mid": words[50],
+        "rare": words[4000],
+        "prefix": words[10][:3],
+        "two_words": f"{words[1]} {words[30]}",
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        create_tables(bind=engine)
+        started = time.perf_counter()
+        seed(engine, rows, words)
+        print(f"Seeded {rows} rows in {time.perf_counter() - started:.1f}s")
+        Session = sessionmaker(bind=engine, autoflush=False)
+
+        for name, q in cases.items():
+            filters = main.ExpenseFilters(search=search.match_expression(q))
+            for sort in ("rank", "date_desc"):
+                samples = []
+                for _ in range(queries):
+                    with Session() as db:
+                        started = time.perf_counter()
+                        page, _ = main.list_expense_rows(db, filters, sort, limit)
+                        samples.append(time.perf_counter() - started)
+                with Session() as db:
+                    matches = db.query(Expense.id).filter(*main.expense_filters(filters)).count()
+                results[f"{name}:{sort}"] = {"q": q, "matches": matches, **percentiles(samples)}
+        engine.dispose()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.queries, args.limit)
+    for case, stats in results.items():
+        print(
+            f"{case:>20} q={stats['q']!r:<22} matches={stats['matches']:>8}  "
+            f"p50={stats['p50']}ms p95={stats['p95']}ms p99={stats['p99']}ms"
+        )
+
+    if args.output:
+        write_results(args.output, "search", results)
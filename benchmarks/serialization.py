@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Per-row cost of rendering GET /expenses pages through ExpenseResponse objects
+versus the FAST_JSON path that encodes plain column tuples.
+
+Both paths run the same query against the same database; the script fails if
+their response bodies differ by a single byte.
+
+Usage:
+    python benchmarks/serialization.py [--rows 50000] [--repeat 5]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from common import use_backend, write_results
+
+use_backend()
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+import main
+import schemas
+from models import Base, Expense, build_engine
+
+CATEGORIES = ["Food", "Travel", "Rent", "Utilities", "Fun"]
+DESCRIPTIONS = ["Groceries", "Café au lait", "Taxi \"airport\"", "Rent\tMarch", "Concert 🎵"]
+
+def seed(engine, rows):
+    start = date(2020, 1, 1)
+    created = datetime(2024, 1, 1, 9, 30)
+    with engine.begin() as conn:
+        conn.execute(insert(Expense), [
+            {
+                "idempotency_key": f"seed-{i}",
+                "amount_cents": 100 + i % 5000,
+                "category": CATEGORIES[i % len(CATEGORIES)],
+                "description": f"{DESCRIPTIONS[i % len(DESCRIPTIONS)]} {i}",
+                "date": start + timedelta(days=i % 1500),
+                # Every other row has whole seconds, which isoformat renders without microseconds
+                "created_at": created + timedelta(seconds=i, microseconds=(i % 2) * 1234),
+            }
+            for i in range(rows)
+        ])
+
+def time_render(Session, fast, params, repeat):
+    main.FAST_JSON = fast
+    best, body = None, None
+    for _ in range(repeat):
+        with Session() as db:
+            started = time.perf_counter()
+            body, _ = main.render_page(db, *params)
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+def run(rows, limits, repeat):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        seed(engine, rows)
+        Session = sessionmaker(bind=engine, autoflush=False)
+
+        for limit in limits:
+            params = (main.ExpenseFilters(), "created_desc", limit, None)
+            page_rows = min(limit or rows, rows)
+            slow_seconds, slow_body = time_render(Session, False, params, repeat)
+            fast_seconds, fast_body = time_render(Session, True, params, repeat)
+            if slow_body != fast_body:
+                raise SystemExit(f"FAST_JSON output differs from the response_model path at limit={limit}")
+            results[str(limit or "all")] = {
+                "rows": page_rows,
+                "bytes": len(fast_body),
+                "model_us_per_row": round(slow_seconds / page_rows * 1e6, 3),
+                "fast_us_per_row": round(fast_seconds / page_rows * 1e6, 3),
+                "speedup": round(slow_seconds / fast_seconds, 2),
+            }
+        engine.dispose()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--limits", type=int, nargs="+", default=[50, 500, 0],
+                        help="page sizes to render; 0 renders every row")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    encoder = "orjson" if schemas.orjson is not None else "json (orjson not installed)"
+    print(f"Encoder: {encoder}")
+    results = run(args.rows, [limit or None for limit in args.limits], args.repeat)
+    for limit, stats in results.items():
+        print(
+            f"limit={limit:>5} rows={stats['rows']:>6}: model {stats['model_us_per_row']:>7.2f}us/row  "
+            f"fast {stats['fast_us_per_row']:>7.2f}us/row  ({stats['speedup']}x, identical bytes)"
+        )
+
+    if args.output:
+        write_results(args.output, "serialization", {"encoder": encoder, "pages": results})
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Concurrent read/write throughput of each SQLite connection profile.
+
+Reader threads page through expenses while writer threads insert and
+commit one expense at a time, the same pattern as GET and POST /expenses.
+
+Usage:
+    python benchmarks/sqlite_profiles.py [--readers 8] [--writers 2] [--seconds 5]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from common import percentiles, use_backend, write_results
+
+use_backend()
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Expense, SQLITE_PROFILES, build_engine
+
+CATEGORIES = ["Food", "Travel", "Rent", "Utilities", "Fun"]
+
+def seed(engine, rows):
+    start = date(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Expense), [
+            {
+                "idempotency_key": f"seed-{i}",
+                "amount_cents": 100 + i % 5000,
+                "category": CATEGORIES[i % len(CATEGORIES)],
+                "description": f"Seed expense {i}",
+                "date": start + timedelta(days=i % 1500),
+            }
+            for i in range(rows)
+        ])
+
+def run_profile(profile, readers, writers, seconds, seed_rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", profile)
+        Base.metadata.create_all(bind=engine)
+        seed(engine, seed_rows)
+        Session = sessionmaker(bind=engine)
+
+        stop = threading.Event()
+        latencies = {"read": [], "write": []}
+        errors = {"read": 0, "write": 0}
+        lock = threading.Lock()
+
+        def reader(n):
+            samples, failed = [], 0
+            query = (
+                select(Expense)
+                .where(Expense.category == CATEGORIES[n % len(CATEGORIES)])
+                .order_by(Expense.created_at.desc(), Expense.id.desc())
+                .limit(50)
+            )
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    with Session() as db:
+                        db.scalars(query).all()
+                    samples.append(time.perf_counter() - started)
+                except OperationalError:
+                    failed += 1
+            with lock:
+                latencies["read"].extend(samples)
+                errors["read"] += failed
+
+        def writer(n):
+            samples, failed, i = [], 0, 0
+            while not stop.is_set():
+                i += 1
+                started = time.perf_counter()
+                try:
+                    with Session() as db:
+                        db.add(Expense(
+                            idempotency_key=f"bench-{n}-{i}",
+                            amount_cents=1234,
+                            category=CATEGORIES[i % len(CATEGORIES)],
+                            description="Benchmark expense",
+                            date=date.today(),
+                        ))
+                        db.commit()
+                    samples.append(time.perf_counter() - started)
+                except OperationalError:
+                    failed += 1
+            with lock:
+                latencies["write"].extend(samples)
+                errors["write"] += failed
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+        threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    return {
+        kind: {
+            "ops": len(latencies[kind]),
+            "ops_per_sec": round(len(latencies[kind]) / seconds, 1),
+            "errors": errors[kind],
+            **percentiles(latencies[kind]),
+        }
+        for kind in ("read", "write")
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--seed-rows", type=int, default=20000)
+    parser.add_argument("--profiles", nargs="+", default=sorted(SQLITE_PROFILES))
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for profile in args.profiles:
+        results[profile] = run_profile(profile, args.readers, args.writers, args.seconds, args.seed_rows)
+        for kind, stats in results[profile].items():
+            print(
+                f"{profile:>8} {kind:>5}: {stats['ops_per_sec']:>9.1f} ops/s  "
+                f"p50={stats['p50']}ms p95={stats['p95']}ms p99={stats['p99']}ms errors={stats['errors']}"
+            )
+
+    if args.output:
+        write_results(args.output, "sqlite_profiles", results)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useMemo, useRef } from 'react';
 
 const ExpenseList = ({ refreshTrigger }) => {
   const [expenses, setExpenses] = useState([]);
@@ -6,7 +6,11 @@ const ExpenseList = ({ refreshTrigger }) => {
   const [error, setError] = useState('');
   const [categoryFilter, setCategoryFilter] = useState('');
   const [sortByDate, setSortByDate] = useState(false);
-  const [categories, setCategories] = useState([]);
+  const [totalCents, setTotalCents] = useState(0);
+  // Change sequence the displayed list is current to; null until the first full load
+  const changeSeq = useRef(null);
+  // Unique categories of the loaded expenses, kept in step with every load and merge
+  const categories = useMemo(() => [...new Set(expenses.map(expense => expense.category))], [expenses]);
 
   const fetchExpenses = async () => {
     setLoading(true);
@@ -23,12 +27,15 @@ const ExpenseList = ({ refreshTrigger }) => {
         filters.sort = 'date_desc';
       }
       
-      const data = await api.getExpenses(filters);
+      // Take the high-water mark first: anything created during the load comes back as a change
+      const { since } = await api.getExpenseChanges();
+      const [data, summary] = await Promise.all([
+        api.getExpenses(filters),
+        api.getSummary({ category: filters.category })
+      ]);
+      changeSeq.current = since;
       setExpenses(data);
-      
-      // Extract unique categories
-      const uniqueCategories = [...new Set(data.map(expense => expense.category))];
-      setCategories(uniqueCategories);
+      setTotalCents(summary.total_cents);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -36,11 +43,46 @@ const ExpenseList = ({ refreshTrigger }) => {
     }
   };
 
+  // Merge expenses created since the last load instead of downloading the whole list again
+  const fetchChanges = async () => {
+    try {
+      const { api } = await import('./api');
+      let changes = [];
+      let page;
+      do {
+        page = await api.getExpenseChanges(changeSeq.current);
+        changes = changes.concat(page.expenses);
+        changeSeq.current = page.since;
+      } while (page.has_more);
+      
+      const summary = await api.getSummary({ category: categoryFilter || undefined });
+      const added = changes.filter(expense => !categoryFilter || expense.category === categoryFilter);
+      const sortKey = sortByDate ? 'date' : 'created_at';
+      setExpenses(current => {
+        const known = new Set(current.map(expense => expense.id));
+        const merged = current.concat(added.filter(expense => !known.has(expense.id)));
+        // Same order as the server: newest first, ties broken by id
+        merged.sort((a, b) => (a[sortKey] === b[sortKey] ? b.id - a.id : (a[sortKey] < b[sortKey] ? 1 : -1)));
+        return merged;
+      });
+      setTotalCents(summary.total_cents);
+    } catch (err) {
+      setError(err.message);
+    }
+  };
+
   useEffect(() => {
     fetchExpenses();
-  }, [refreshTrigger, categoryFilter, sortByDate]);
+  }, [categoryFilter, sortByDate]);
+
+  useEffect(() => {
+    // The initial render is covered by the full load
+    if (changeSeq.current !== null) {
+      fetchChanges();
+    }
+  }, [refreshTrigger]);
 
-  const totalAmount = expenses.reduce((sum, expense) => sum + expense.amount_cents, 0) / 100;
+  const totalAmount = totalCents / 100;
 
   if (loading) {
     return <div>Loading expenses...</div>;
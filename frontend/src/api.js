@@ -34,14 +34,32 @@ export const api = {
   },
 
   async getExpenses(filters = {}) {
+    const { expenses } = await this.getExpensesPage(filters);
+    return expenses;
+  },
+
+  // Fetch one page; pass the returned nextCursor back as filters.cursor for the next page
+  async getExpensesPage(filters = {}) {
     const params = new URLSearchParams();
     
-    if (filters.category) {
-      params.append('category', filters.category);
-    }
+    // category may be a single name or an array of names
+    [].concat(filters.category || []).forEach(category => {
+      params.append('category', category);
+    });
+    ['date_from', 'date_to', 'min_amount', 'max_amount', 'description_prefix'].forEach(name => {
+      if (filters[name] != null && filters[name] !== '') {
+        params.append(name, filters[name]);
+      }
+    });
     if (filters.sort) {
       params.append('sort', filters.sort);
     }
+    if (filters.limit) {
+      params.append('limit', filters.limit);
+    }
+    if (filters.cursor) {
+      params.append('cursor', filters.cursor);
+    }
 
     const url = `${API_BASE}/expenses?${params}`;
     console.log('Fetching expenses from:', url);
@@ -57,10 +75,60 @@ export const api = {
 
       const data = await response.json();
       console.log('Fetched expenses:', data);
-      return data;
+      return { expenses: data, nextCursor: response.headers.get('X-Next-Cursor') };
     } catch (error) {
       console.error('Get expenses error:', error);
       throw new Error('Failed to fetch expenses');
     }
+  },
+
+  // Expenses created after change sequence `since`, oldest first, and the new high-water mark.
+  // Omit since to get only the current mark; wait (seconds) long-polls when nothing has changed.
+  async getExpenseChanges(since, { limit, wait } = {}) {
+    const params = new URLSearchParams();
+    
+    if (since != null) {
+      params.append('since', since);
+    }
+    if (limit) {
+      params.append('limit', limit);
+    }
+    if (wait) {
+      params.append('wait', wait);
+    }
+
+    try {
+      const response = await fetch(`${API_BASE}/expenses/changes?${params}`);
+      
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+
+      return response.json();
+    } catch (error) {
+      console.error('Get expense changes error:', error);
+      throw new Error('Failed to fetch expense changes');
+    }
+  },
+
+  async getSummary(filters = {}) {
+    const params = new URLSearchParams();
+    
+    if (filters.category) {
+      params.append('category', filters.category);
+    }
+
+    try {
+      const response = await fetch(`${API_BASE}/expenses/summary?${params}`);
+      
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+
+      return response.json();
+    } catch (error) {
+      console.error('Get summary error:', error);
+      throw new Error('Failed to fetch expense summary');
+    }
   }
 };
\ No newline at end of file
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Check the backend API end to end through FastAPI's TestClient: keyset pages, summary totals,
+batch and retry idempotency (LRU, bloom filter and group commit) and ETag revalidation.
+Uses a scratch SQLite database; no server needed.
+"""
+
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'api.db')}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from group_commit import GroupCommitWriter
+from idempotency import idempotency_index
+from main import app, commit_group
+from models import Expense, SessionLocal
+from schemas import ExpenseCreate
+
+# Every test writes to categories of its own, so tests sharing the database do not see each other's rows
+run_ids = itertools.count(1)
+
+def category(name):
+    return f"{name}-{os.getpid()}-{next(run_ids)}"
+
+def expense(key, category, amount=10.0, day=15, description="Test expense"):
+    return {"idempotency_key": key, "amount": amount, "category": category,
+            "description": description, "date": f"2024-01-{day:02d}"}
+
+def walk_pages(client, **params):
+    """Follow X-Next-Cursor to the last page; returns the ids of each page"""
+    pages, cursor = [], None
+    while True:
+        response = client.get("/expenses", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        pages.append([row["id"] for row in response.json()])
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return pages
+
+def test_cursor_pages_have_no_overlap_or_gaps():
+    name = category("pages")
+    with TestClient(app) as client:
+        # Several expenses share each date, so pages must break ties on id
+        created = [
+            client.post("/expenses", json=expense(f"{name}-{n}", name, day=1 + n % 4)).json()["id"]
+            for n in range(23)
+        ]
+        for sort in ("created_desc", "date_desc"):
+            pages = walk_pages(client, category=name, sort=sort, limit=5)
+            ids = [expense_id for page in pages for expense_id in page]
+            assert [len(page) for page in pages] == [5, 5, 5, 5, 3], f"{sort}: pages of {pages}"
+            assert len(set(ids)) == len(ids), f"{sort}: a row appeared on two pages"
+            assert sorted(ids) == sorted(created), f"{sort}: a row was skipped"
+            full = [row["id"] for row in client.get("/expenses", params={"category": name, "sort": sort}).json()]
+            assert ids == full, f"{sort}: pages are not in the order of the full listing"
+
+def test_cursor_pages_ignore_rows_inserted_between_pages():
+    name = category("moving")
+    with TestClient(app) as client:
+        for n in range(6):
+            client.post("/expenses", json=expense(f"{name}-{n}", name))
+        first = client.get("/expenses", params={"category": name, "limit": 3})
+        newer = client.post("/expenses", json=expense(f"{name}-new", name)).json()["id"]
+        rest = client.get("/expenses", params={"category": name, "limit": 3,
+                                               "cursor": first.headers["x-next-cursor"]})
+        ids = [row["id"] for row in first.json() + rest.json()]
+        assert len(set(ids)) == 6 and newer not in ids, f"listed {ids}"
+
+def test_summary_matches_sum_after_creates():
+    food, travel = category("summary-food"), category("summary-travel")
+    amounts = {food: [12.34, 0.01, 99.99], travel: [250.0, 7.5]}
+    with TestClient(app) as client:
+        for name, values in amounts.items():
+            for n, amount in enumerate(values):
+                assert client.post("/expenses", json=expense(f"{name}-{n}", name, amount=amount)).status_code == 200
+        # A retry must not be counted twice
+        client.post("/expenses", json=expense(f"{food}-0", food, amount=12.34))
+        db = SessionLocal()
+        try:
+            for name, values in amounts.items():
+                summary = client.get("/expenses/summary", params={"category": name}).json()
+                count, total = db.execute(
+                    select(func.count(), func.sum(Expense.amount_cents)).where(Expense.category == name)
+                ).one()
+                assert (summary["count"], summary["total_cents"]) == (count, total) == (
+                    len(values), sum(round(amount * 100) for amount in values)
+                ), f"{name}: {summary}"
+                assert summary["by_category"] == [{"category": name, "count": count, "total_cents": total}]
+        finally:
+            db.close()
+
+def test_batch_with_repeated_key():
+    name = category("batch")
+    with TestClient(app) as client:
+        batch = [expense(f"{name}-a", name, amount=1), expense(f"{name}-a", name, amount=2),
+                 expense(f"{name}-b", name, amount=3)]
+        results = client.post("/expenses/batch", json=batch).json()
+        assert [result["status"] for result in results] == ["created", "duplicate", "created"]
+        assert results[0]["expense"] == results[1]["expense"], "the repeat did not return the first expense"
+        assert results[1]["expense"]["amount_cents"] == 100
+        again = client.post("/expenses/batch", json=batch).json()
+        assert [result["status"] for result in again] == ["duplicate"] * 3
+        assert [result["expense"]["id"] for result in again] == [result["expense"]["id"] for result in results]
+        assert len(client.get("/expenses", params={"category": name}).json()) == 2
+
+def test_retry_returns_original_from_lru():
+    name = category("lru")
+    with TestClient(app) as client:
+        original = client.post("/expenses", json=expense(f"{name}-a", name, amount=5)).json()
+        before = client.get("/idempotency/stats").json()
+        retry = client.post("/expenses", json=expense(f"{name}-a", name, amount=6)).json()
+        after = client.get("/idempotency/stats").json()
+        assert retry == original
+        assert after["lru_hits"] == before["lru_hits"] + 1
+        assert after["lookups"] == before["lookups"], "an LRU hit still queried the database"
+
+def test_retry_returns_original_through_bloom_filter():
+    name = category("bloom")
+    with TestClient(app) as client:
+        before = client.get("/idempotency/stats").json()
+        assert before["seeded"], "the filter was not seeded at startup"
+        original = client.post("/expenses", json=expense(f"{name}-a", name, amount=5)).json()
+        after_create = client.get("/idempotency/stats").json()
+        assert after_create["fast_path"] == before["fast_path"] + 1, "a new key was looked up"
+    # As after a restart: the LRU is empty and the filter, seeded again from the table, sends the retry to the SELECT
+    with TestClient(app) as client:
+        idempotency_index._recent.clear()
+        before = client.get("/idempotency/stats").json()
+        retry = client.post("/expenses", json=expense(f"{name}-a", name, amount=6)).json()
+        after = client.get("/idempotency/stats").json()
+        assert retry == original
+        assert after["lookups"] == before["lookups"] + 1
+        assert after["false_positives"] == before["false_positives"]
+
+def test_retry_returns_original_under_group_commit():
+    name = category("group")
+
+    async def submit_all():
+        writer = GroupCommitWriter(commit_group, window=0.05)
+        writer.start()
+        try:
+            # The same key three times in one batch, then a retry in a later batch
+            keys = (f"{name}-a", f"{name}-b", f"{name}-a", f"{name}-a")
+            first = await asyncio.gather(*(writer.submit(ExpenseCreate(**expense(key, name))) for key in keys))
+            retry = await writer.submit(ExpenseCreate(**expense(f"{name}-a", name, amount=99)))
+            return first, retry, writer.batches
+        finally:
+            await writer.stop()
+
+    with TestClient(app) as client:
+        first, retry, batches = asyncio.run(submit_all())
+        assert batches == 2, f"wrote {batches} batches"
+        assert first[0] == first[2] == first[3] == retry, "a retry created a second expense"
+        assert first[1].id != first[0].id
+        assert len(client.get("/expenses", params={"category": name}).json()) == 2
+
+def test_unchanged_high_water_mark_returns_304():
+    name = category("etag")
+    with TestClient(app) as client:
+        client.post("/expenses", json=expense(f"{name}-a", name))
+        first = client.get("/expenses", params={"category": name})
+        etag = first.headers["etag"]
+        unchanged = client.get("/expenses", params={"category": name}, headers={"If-None-Match": etag})
+        assert unchanged.status_code == 304 and unchanged.content == b""
+        assert unchanged.headers["etag"] == etag
+        # A retry writes nothing, so the high-water mark and the ETag stay put
+        client.post("/expenses", json=expense(f"{name}-a", name))
+        assert client.get("/expenses", params={"category": name},
+                          headers={"If-None-Match": etag}).status_code == 304
+        client.post("/expenses", json=expense(f"{name}-b", name))
+        changed = client.get("/expenses", params={"category": name}, headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+        assert len(changed.json()) == 2
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in list(globals().items()) if name.startswith("test_")]
+    failed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"✅ {name}")
+        except AssertionError as error:
+            failed += 1
+            print(f"❌ {name}: {error}")
+    if failed:
+        sys.exit(1)
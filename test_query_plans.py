@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Check that every GET /expenses filter combination is served by an index.
+Runs EXPLAIN QUERY PLAN against a scratch SQLite database; no server needed.
+"""
+
+from datetime import date, datetime
+from itertools import combinations
+import os
+import sys
+import tempfile
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'plans.db')}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from changes import changes_query
+from main import Expense, ExpenseFilters, encode_cursor, page_query
+from models import create_tables, engine
+
+FILTER_VALUES = {
+    "categories": ("Food",),
+    "date_from": date(2024, 1, 1),
+    "date_to": date(2024, 3, 31),
+    "min_cents": 500,
+    "max_cents": 5000,
+    "description_prefix": "Coffee",
+    "search": '"coffee"*',
+}
+
+# Filters with an index of their own; amount bounds are checked while walking the sort index
+SEARCH_FILTERS = {"categories", "description_prefix", "search"}
+
+def query_plan(query):
+    sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+def filter_combinations():
+    names = list(FILTER_VALUES)
+    for size in range(len(names) + 1):
+        for combo in combinations(names, size):
+            yield combo, ExpenseFilters(**{name: FILTER_VALUES[name] for name in combo})
+    yield ("categories",), ExpenseFilters(categories=("Food", "Travel"))
+
+def check_plans():
+    create_tables()
+    failures = []
+    cursors = {
+        "created_desc": encode_cursor("created_desc", datetime(2024, 2, 1, 12, 0), 100),
+        "date_desc": encode_cursor("date_desc", date(2024, 2, 1), 100),
+        "rank": encode_cursor("rank", 50, 100),
+    }
+    for sort, cursor in cursors.items():
+        for combo, filters in filter_combinations():
+            # Relevance order only exists for search queries
+            if sort == "rank" and not filters.search:
+                continue
+            for page_cursor in (None, cursor):
+                query, _, _ = page_query([Expense], filters, sort, page_cursor)
+                plan = query_plan(query.limit(51))
+                searched = any(step.startswith("SEARCH expenses USING") for step in plan)
+                indexed = searched or any(step.startswith("SCAN expenses USING") for step in plan)
+                if sort == "date_desc" and {"date_from", "date_to"} & set(combo):
+                    needs_search = True
+                else:
+                    needs_search = bool(SEARCH_FILTERS & set(combo))
+                if not indexed or (needs_search and not searched):
+                    failures.append((sort, combo, bool(page_cursor), plan))
+    # Polling for changes must cost the number of changes, not the table size
+    plan = query_plan(changes_query(100, 501))
+    if not any(step.startswith("SEARCH expenses USING INDEX ix_expenses_change_seq") for step in plan):
+        failures.append(("changes", ("since",), False, plan))
+    return failures
+
+def test_query_plans():
+    failures = check_plans()
+    assert not failures, "\n".join(
+        f"{sort} {combo} cursor={cursor}: {plan}" for sort, combo, cursor, plan in failures
+    )
+
+if __name__ == "__main__":
+    failures = check_plans()
+    for sort, combo, cursor, plan in failures:
+        print(f"❌ {sort} {', '.join(combo) or 'no filters'} (cursor={cursor}): {plan}")
+    if failures:
+        sys.exit(1)
+    print("✅ Every filter combination uses an index")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Check the serverless log store in api/storage.py: concurrent appends, the sidecar index,
+compaction, torn writes and migration from the old JSON file. Uses scratch files; no server needed.
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["EXPENSES_LOG_FILE"] = os.path.join(SCRATCH_DIR, "expenses.ndjson")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+
+import storage
+
+def use_log(name):
+    """Point storage at a fresh log in the scratch directory and forget any cached state"""
+    directory = tempfile.mkdtemp(dir=SCRATCH_DIR, prefix=f"{name}-")
+    storage.STORAGE_FILE = os.path.join(directory, "expenses.ndjson")
+    storage.INDEX_FILE = storage.STORAGE_FILE + ".idx"
+    storage.LEGACY_STORAGE_FILE = os.path.join(directory, "expenses.json")
+    storage._reset_state(None)
+    storage._index["current"] = None
+    return storage.STORAGE_FILE
+
+def expense(key, amount=10.0, category="Food"):
+    return {"idempotency_key": key, "amount": amount, "category": category,
+            "description": f"expense {key}", "date": "2024-01-15"}
+
+def read_log(path):
+    with open(path, "rb") as f:
+        return [json.loads(line) for line in f]
+
+def cold_page(**filters):
+    """A full listing as a new instance would read it, through the sidecar index if there is one"""
+    storage._index["current"] = None
+    page, _ = storage.get_expenses(**filters)
+    return [record["id"] for record in page]
+
+def append_many(args):
+    """Worker: add this process's expenses plus a key every worker retries, reading as it goes"""
+    worker, count = args
+    ids = {}
+    for n in range(count):
+        key = f"w{worker}-{n}"
+        ids[key] = storage.add_expense(expense(key, category=("Food", "Travel")[n % 2]))["id"]
+        ids["shared"] = storage.add_expense(expense("shared"))["id"]
+        storage.get_expenses(limit=5)
+    return ids
+
+def test_concurrent_appends():
+    path = use_log("concurrent")
+    workers, count = 4, 50
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        results = pool.map(append_many, [(worker, count) for worker in range(workers)])
+    records = read_log(path)
+    assert len(records) == workers * count + 1, "a write was lost or duplicated"
+    assert sorted(record["id"] for record in records) == list(range(1, len(records) + 1))
+    by_key = {record["idempotency_key"]: record["id"] for record in records}
+    for ids in results:
+        for key, expense_id in ids.items():
+            assert by_key[key] == expense_id, f"{key} was answered with another record"
+    # Every worker extended the sidecar; it must still match an index rebuilt from the log
+    from_sidecar = cold_page(sort_param="date_desc", categories=["Travel"])
+    os.remove(storage.INDEX_FILE)
+    assert from_sidecar == cold_page(sort_param="date_desc", categories=["Travel"])
+
+def test_sidecar_is_extended_by_appending():
+    use_log("sidecar")
+    for n in range(20):
+        storage.add_expense(expense(f"a{n}"))
+    assert len(cold_page()) == 20
+    before = os.stat(storage.INDEX_FILE)
+    for n in range(3):
+        storage.add_expense(expense(f"b{n}"))
+    assert len(storage.get_expenses()[0]) == 23
+    after = os.stat(storage.INDEX_FILE)
+    assert after.st_ino == before.st_ino, "the sidecar was rewritten rather than appended to"
+    assert after.st_size == before.st_size + 3 * storage.INDEX_ROW.size
+    assert cold_page() == list(range(23, 0, -1))
+
+def write_records(path, records):
+    with open(path, "a") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+
+def test_list_skips_records_repeating_a_key():
+    path = use_log("repeated-key")
+    record = {"amount_cents": 100, "category": "Food", "date": "2024-01-15"}
+    write_records(path, [{**record, "id": 1, "idempotency_key": "a"}, {**record, "id": 2, "idempotency_key": "b"}])
+    assert len(cold_page()) == 2
+    # A racing writer's copy of "a", after the sidecar was written, then one before the next read
+    write_records(path, [{**record, "id": 3, "idempotency_key": "a"}, {**record, "id": 3, "idempotency_key": "c"}])
+    for page in (cold_page(), cold_page(categories=["Food"]), cold_page(sort_param="date_desc")):
+        assert sorted(page) == [1, 2, 3], f"listed {page}"
+    write_records(path, [{**record, "id": 4, "idempotency_key": "b"}])
+    keys = [record["idempotency_key"] for record in storage.get_expenses()[0]]
+    assert sorted(keys) == ["a", "b", "c"], f"listed {keys}"
+    assert storage.summarize_expenses()["count"] == len(keys)
+
+def test_changes_skip_records_repeating_a_key():
+    path = use_log("changes-repeated-key")
+    record = {"amount_cents": 100, "category": "Food", "date": "2024-01-15"}
+    write_records(path, [{**record, "id": 1, "idempotency_key": "a"}, {**record, "id": 2, "idempotency_key": "b"}])
+    assert storage.get_changes(None) == ([], 2, False)
+    write_records(path, [{**record, "id": 2, "idempotency_key": "a"}, {**record, "id": 3, "idempotency_key": "c"}])
+    expenses, high_water, has_more = storage.get_changes(0)
+    assert [(e["id"], e["idempotency_key"]) for e in expenses] == [(1, "a"), (2, "b"), (3, "c")]
+    assert (high_water, has_more) == (3, False)
+    assert [e["idempotency_key"] for e in storage.get_changes(2)[0]] == ["c"]
+
+def test_keyless_records_are_counted_and_kept():
+    path = use_log("keyless")
+    rows = [
+        {"id": 1, "idempotency_key": "a", "amount_cents": 100, "category": "Food", "date": "2024-01-01"},
+        {"id": 2, "amount_cents": 200, "category": "Food", "date": "2024-01-02"},
+        {"id": 3, "idempotency_key": "a", "amount_cents": 100, "category": "Food", "date": "2024-01-01"},
+        {"id": 3, "amount_cents": 300, "category": "Travel", "date": "2024-01-03"},
+    ]
+    with open(path, "w") as f:
+        f.writelines(json.dumps(row) + "\n" for row in rows)
+        f.write("not json\n")
+    assert storage.add_expense(expense("b"))["id"] == 4
+    storage.compact()
+    records = read_log(path)
+    assert [record["id"] for record in records] == [1, 2, 3, 4], "compaction dropped a live record"
+    assert storage.add_expense(expense("c"))["id"] == 5
+    assert len(storage.load_expenses()) == 5
+
+def test_summary_streams_live_records():
+    path = use_log("summary")
+    storage.add_expense(expense("a", amount=1.5))
+    storage.add_expense(expense("b", amount=2, category="Travel"))
+    # A second copy of a key, as a crashed writer could leave, is not counted twice
+    with open(path, "a") as f:
+        f.write(json.dumps({"id": 3, "idempotency_key": "a", "amount_cents": 999, "category": "Food",
+                            "date": "2024-02-01"}) + "\n")
+    summary = storage.summarize_expenses()
+    assert (summary["count"], summary["total_cents"]) == (2, 350)
+    assert summary["by_month"] == [{"month": "2024-01", "count": 2, "total_cents": 350}]
+    assert storage.summarize_expenses("Travel")["by_category"] == [
+        {"category": "Travel", "count": 1, "total_cents": 200}
+    ]
+
+def test_missing_key_is_rejected():
+    use_log("missing-key")
+    try:
+        storage.add_expense(expense(None))
+    except ValueError:
+        return
+    raise AssertionError("an expense without an idempotency key was stored")
+
+def test_torn_tail_is_repaired():
+    path = use_log("torn")
+    storage.add_expense(expense("a"))
+    with open(path, "ab") as f:
+        f.write(b'{"id": 2, "idempotency_key": "half')
+    storage._reset_state(None)
+    assert storage.add_expense(expense("b"))["id"] == 2
+    assert [record["idempotency_key"] for record in read_log(path)] == ["a", "b"]
+
+def test_legacy_file_is_migrated_once():
+    path = use_log("legacy")
+    legacy = [
+        {"id": 1, "idempotency_key": "old-1", "amount_cents": 100, "category": "Food", "date": "2023-05-01",
+         "created_at": "2023-05-01T10:00:00"},
+        {"id": 2, "idempotency_key": "old-2", "amount_cents": 200, "category": "Travel", "date": "2023-06-01",
+         "created_at": "2023-06-01T10:00:00"},
+    ]
+    with open(storage.LEGACY_STORAGE_FILE, "w") as f:
+        json.dump(legacy, f)
+    page, _ = storage.get_expenses()
+    assert [record["id"] for record in page] == [2, 1]
+    assert storage.add_expense(expense("old-1"))["id"] == 1
+    assert storage.add_expense(expense("new"))["id"] == 3
+    # The log now exists, so the old file is not imported again
+    storage._migrate_legacy_file()
+    assert len(read_log(path)) == 3
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in list(globals().items()) if name.startswith("test_")]
+    failed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"✅ {name}")
+        except AssertionError as error:
+            failed += 1
+            print(f"❌ {name}: {error}")
+    if failed:
+        sys.exit(1)